@@ -0,0 +1,134 @@
+import argparse
+import concurrent.futures
+import copy
+import os
+import time
+
+from convert import *
+
+
+class WorldResult(NamedTuple):
+    name: str
+    seconds: float
+    location_count: int
+    rule_count: int
+    output_size: int
+    error: str
+
+
+def is_apworld(path: str) -> bool:
+    return ((path.endswith(".apworld") and zip.is_zipfile(path)) or
+            os.path.exists(os.path.join(path, "data", "items.json")))
+
+
+def find_apworlds(paths: list[str]) -> list[str]:
+    apworld_paths: list[str] = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if is_apworld(path):
+            apworld_paths.append(path)
+        elif os.path.isdir(path):
+            for entry in sorted(os.listdir(path)):
+                if is_apworld(os.path.join(path, entry)):
+                    apworld_paths.append(os.path.join(path, entry))
+        else:
+            raise FileNotFoundError(f"{path} is not an APWorld or a directory containing APWorlds")
+    return apworld_paths
+
+
+def get_world_name(apworld_path: str) -> str:
+    return os.path.splitext(os.path.basename(apworld_path))[0]
+
+
+def count_access_rules(state: ConversionState) -> int:
+    rule_count: int = 0
+    for converted_group in state.groups.values():
+        for top_level_json in converted_group.poptracker_locations:
+            for region_entry in top_level_json["children"]:
+                rule_count += len(region_entry["access_rules"])
+                for section in region_entry["sections"]:
+                    rule_count += len(section.get("access_rules", []))
+    return rule_count
+
+
+def get_output_size(output_path: str) -> int:
+    if os.path.isfile(output_path):
+        return os.path.getsize(output_path)
+    output_size: int = 0
+    for directory, _, file_names in os.walk(output_path):
+        for file_name in file_names:
+            output_size += os.path.getsize(os.path.join(directory, file_name))
+    return output_size
+
+
+def convert_world_in_batch(args: argparse.Namespace) -> WorldResult:
+    world_name: str = get_world_name(args.apworld_path)
+    start_time: float = time.perf_counter()
+    try:
+        state, _ = convert_apworld(args)
+    except Exception as e:
+        # one broken world should not stop the rest of the batch
+        return WorldResult(world_name, time.perf_counter() - start_time, 0, 0, 0, f"{type(e).__name__}: {e}")
+    return WorldResult(world_name, time.perf_counter() - start_time, len(state.world["locations"]),
+                       count_access_rules(state), get_output_size(args.output_path), "")
+
+
+def get_world_args(batch_args: argparse.Namespace, apworld_path: str) -> argparse.Namespace:
+    world_name: str = get_world_name(apworld_path)
+    world_args: argparse.Namespace = copy.copy(batch_args)
+    world_args.apworld_path = apworld_path
+    world_args.output_path = os.path.join(batch_args.output_dir, f"{world_name}.zip" if batch_args.zip else world_name)
+    if batch_args.rule_cache:
+        # every world keeps its own cache, so concurrent conversions never write the same file
+        cache_root, cache_extension = os.path.splitext(os.path.abspath(batch_args.rule_cache))
+        world_args.rule_cache = f"{cache_root}.{world_name}{cache_extension}"
+    world_args.jobs = 1
+    world_args.watch = False
+    return world_args
+
+
+def print_summary_table(results: list[WorldResult], total_seconds: float) -> None:
+    name_width: int = max([len("world")] + [len(result.name) for result in results])
+    print(f"\n{'world'.ljust(name_width)} {'time (s)':>9} {'locations':>10} {'rules':>8} {'output bytes':>13}  status")
+    for result in results:
+        status: str = f"FAILED: {result.error}" if result.error else "ok"
+        print(f"{result.name.ljust(name_width)} {result.seconds:>9.2f} {result.location_count:>10} "
+              f"{result.rule_count:>8} {result.output_size:>13}  {status}")
+    failed_count: int = sum(1 for result in results if result.error)
+    print(f"\nConverted {len(results) - failed_count} of {len(results)} worlds in {total_seconds:.2f}s"
+          + (f", {failed_count} failed" if failed_count else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert many Manual APWorlds to PopTracker packs at once.")
+    parser.add_argument("apworld_paths", nargs="+",
+                        help="The APWorlds to convert, as .apworld files, APWorld folders, or directories containing "
+                             "either.")
+    parser.add_argument("--output_dir", default="poptracker",
+                        help="The directory to build the packs in, each in a folder (or .zip archive) named after its "
+                             "APWorld. Defaults to a folder named poptracker in the current directory.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="The number of APWorlds to convert at the same time. Defaults to the number of CPUs.")
+    add_conversion_arguments(parser)
+    batch_args = parser.parse_args()
+    if batch_args.jobs < 1:
+        parser.error(f"--jobs must be at least 1, got {batch_args.jobs}")
+    batch_args.output_dir = os.path.abspath(batch_args.output_dir)
+
+    apworld_paths: list[str] = find_apworlds(batch_args.apworld_paths)
+    batch_start_time: float = time.perf_counter()
+    results: list[WorldResult] = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=batch_args.jobs) as executor:
+        futures: list[concurrent.futures.Future] = [
+            executor.submit(convert_world_in_batch, get_world_args(batch_args, apworld_path))
+            for apworld_path in apworld_paths
+        ]
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker process itself died, e.g. from running out of memory
+                results.append(WorldResult(get_world_name(apworld_paths[index]), 0, 0, 0, 0,
+                                           f"{type(e).__name__}: {e}"))
+            print(f"Finished {results[-1].name}" + (" (failed)" if results[-1].error else ""))
+    print_summary_table(results, time.perf_counter() - batch_start_time)
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic import *
+
+
+# The character-by-character parser that parse_logic replaced, kept here as the benchmark baseline.
+def legacy_convert_tokens_to_logic(tokens: list[str]) -> Logic:
+    if len(tokens) == 1:
+        token: str = tokens[0]
+        if token.startswith("|") and token.endswith("|") and token.count("|") == 2:
+            return Logic(op=Operator.PRIMITIVE, operands=[], prim_value=token[1:-1])
+        elif token.startswith("{") and token.endswith("}") and token.count("{") == 1:
+            return convert_function_to_primitive(token)
+        else:
+            return legacy_parse_logic(token)
+    for operator, op in [("or", Operator.OR), ("and", Operator.AND)]:
+        if operator in tokens:
+            return_logic: Logic = Logic(op=op, operands=[], prim_value="")
+            while operator in tokens:
+                operator_index = tokens.index(operator)
+                return_logic.operands.append(Operand(value=legacy_convert_tokens_to_logic(tokens[0:operator_index])))
+                tokens = tokens[operator_index+1:]
+            return_logic.operands.append(Operand(value=legacy_convert_tokens_to_logic(tokens)))
+            return return_logic
+    raise SyntaxError(f"Found two operands with no operator {tokens}")
+
+
+def legacy_parse_logic(logic: str) -> Logic:
+    index: int = 0
+    tokens: list[str] = []
+    while index < len(logic):
+        current_char: str = logic[index:index+1]
+        if current_char == '(':
+            cur_depth: int = 1
+            inner_index = index + 1
+            while cur_depth >= 1 and inner_index <= len(logic):
+                inner_char: str = logic[inner_index:inner_index+1]
+                if inner_char == '(':
+                    cur_depth += 1
+                elif inner_char == ')':
+                    cur_depth -= 1
+                inner_index += 1
+            if cur_depth != 0:
+                raise SyntaxError(f"Mismatched parenthesis starting at index {index} for rule {logic}")
+            tokens.append(logic[index+1:inner_index-1])
+            index = inner_index + 1
+        elif current_char == '|':
+            end_index = logic.find("|", index+1)
+            tokens.append(logic[index:end_index+1])
+            index = end_index + 1
+        elif current_char == '{':
+            end_index = logic.find("}", index+1)
+            tokens.append(logic[index:end_index+1])
+            index = end_index + 1
+        elif current_char.isspace():
+            index += 1
+        elif logic[index:index+3].lower() == "and":
+            index += 3
+            tokens.append("and")
+        elif logic[index:index+2].lower() == "or":
+            index += 2
+            tokens.append("or")
+        else:
+            raise SyntaxError(f"Unrecognized logic syntax at index {index} of rule {logic}")
+    return legacy_convert_tokens_to_logic(tokens)
+
+
+def build_long_rule(term_count: int) -> str:
+    rule: str = ""
+    for i in range(term_count):
+        if i:
+            rule += " or " if i % 3 == 0 else " and "
+        rule += f"|Item {i}|" if i % 5 else f"{{ItemValue(Coins:{i})}}"
+    return rule
+
+
+def build_nested_rule(depth: int) -> str:
+    # every level is followed by a space so the baseline's skip after ')' lands on whitespace
+    rule: str = "|Item 0|"
+    for i in range(1, depth):
+        operator: str = "and" if i % 2 else "or"
+        rule = f"|Item {i}| {operator} ({rule}) "
+    return rule.strip()
+
+
+def run_case(name: str, rule: str, repeat: int) -> None:
+    if legacy_parse_logic(rule) != parse_logic(rule):
+        raise AssertionError(f"Parsers disagree on {name}")
+    legacy_time: float = min(timeit.repeat(lambda: legacy_parse_logic(rule), number=1, repeat=repeat))
+    new_time: float = min(timeit.repeat(lambda: parse_logic(rule), number=1, repeat=repeat))
+    print(f"{name.ljust(24)} {len(rule):>8} {legacy_time * 1000:>12.3f} {new_time * 1000:>12.3f} "
+          f"{legacy_time / new_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare parse_logic against the previous parser.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per case; the best is reported.")
+    args = parser.parse_args()
+    print(f"{'case'.ljust(24)} {'chars':>8} {'legacy ms':>12} {'new ms':>12} {'speedup':>9}")
+    for term_count in [10, 100, 1000, 5000]:
+        run_case(f"long, {term_count} terms", build_long_rule(term_count), args.repeat)
+    for depth in [10, 50, 100, 200]:
+        run_case(f"nested, depth {depth}", build_nested_rule(depth), args.repeat)
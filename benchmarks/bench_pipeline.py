@@ -0,0 +1,157 @@
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convert import *
+from generate_world import *
+
+# Settings the scaling curves can vary, by the name given to --vary
+VARIABLE_SETTINGS: dict[str, str] = {
+    "locations": "location_count",
+    "regions": "region_count",
+    "connections": "connections_per_region",
+    "cycle_chance": "cycle_chance",
+    "rule_depth": "rule_depth",
+    "region_rule_depth": "region_rule_depth",
+    "or_fan_out": "or_fan_out",
+    "item_group_size": "item_group_size",
+}
+
+DEFAULT_VALUES: dict[str, list[float]] = {
+    "locations": [250, 1000, 4000],
+    "regions": [5, 10, 15, 20],
+    "connections": [1, 2, 3],
+    "cycle_chance": [0, 0.2, 0.5],
+    "rule_depth": [1, 2, 3, 4],
+    "region_rule_depth": [0, 1, 2],
+    "or_fan_out": [2, 3, 4],
+    "item_group_size": [5, 10, 20],
+}
+
+
+def get_stages(world: dict[str, any], args: argparse.Namespace) -> dict[str, Callable[[], any]]:
+    # the inputs of each logic stage are prepared up front, so each stage is timed on its own
+    item_groups: dict[str, list[str]] = get_item_groups(world["items"])
+    rules: list[str] = [location["requires"] for location in world["locations"] if location.get("requires")]
+    rules += [region["requires"] for region in world["regions"].values() if region.get("requires")]
+    parsed_rules: list[Logic] = [parse_logic(rule) for rule in rules]
+    # rules the converter would factor instead of expanding are left out of the DNF stages, as they are in the pack
+    expandable_rules: list[Logic] = [
+        rule_logic for rule_logic in parsed_rules
+        if not args.max_dnf_clauses or count_dnf_clauses(rule_logic) <= args.max_dnf_clauses
+    ]
+    dnf_rules: list[Logic] = [convert_to_dnf(rule_logic) for rule_logic in expandable_rules]
+    region_graph: dict[str, list[str]] = build_region_graph(world["regions"])
+    regions: dict[str, any] = world["regions"] | {"__start__": {}}
+
+    def convert_regions() -> None:
+        region_logic_table: RegionLogicTable = RegionLogicTable(regions, region_graph, item_groups, args.region_logic)
+        for region in world["regions"]:
+            region_logic_table.get_access_rules(region)
+
+    def convert_full_world() -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_world(world, temp_dir)
+            conversion_args: argparse.Namespace = get_conversion_args(region_logic=args.region_logic,
+                                                                      max_dnf_clauses=args.max_dnf_clauses)
+            conversion_args.apworld_path = temp_dir
+            conversion_args.output_path = os.path.join(temp_dir, "pack")
+            convert_apworld(conversion_args)
+
+    return {
+        "parse_logic": lambda: [parse_logic(rule) for rule in rules],
+        "convert_to_dnf": lambda: [convert_to_dnf(rule_logic) for rule_logic in expandable_rules],
+        "reduce_logic": lambda: [reduce_logic(rule_logic, item_groups) for rule_logic in dnf_rules],
+        "region logic": convert_regions,
+        "full conversion": convert_full_world,
+    }
+
+
+def measure_stage(stage: Callable[[], any], repeat: int) -> tuple[float, int]:
+    best_time: float = float("inf")
+    for _ in range(repeat):
+        start_time: float = time.perf_counter()
+        stage()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    # memory is measured in a separate run, since tracing allocations slows the stage down
+    tracemalloc.start()
+    stage()
+    peak_memory: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_time, peak_memory
+
+
+def run_benchmarks(args: argparse.Namespace) -> list[dict[str, any]]:
+    base_settings: WorldSettings = get_world_settings(args)
+    setting_type: type = type(getattr(base_settings, VARIABLE_SETTINGS[args.vary]))
+    results: list[dict[str, any]] = []
+    for value in args.values or DEFAULT_VALUES[args.vary]:
+        settings: WorldSettings = base_settings._replace(**{VARIABLE_SETTINGS[args.vary]: setting_type(value)})
+        world: dict[str, any] = generate_world(settings)
+        stages: dict[str, Callable[[], any]] = get_stages(copy.deepcopy(world), args)
+        for stage_name, stage in stages.items():
+            if args.stages and stage_name not in args.stages:
+                continue
+            seconds, peak_memory = measure_stage(stage, args.repeat)
+            results.append({"vary": args.vary, "value": setting_type(value), "stage": stage_name,
+                            "seconds": seconds, "peak_memory": peak_memory})
+            print(f"{args.vary} = {setting_type(value):<8} {stage_name:<18} {seconds * 1000:>12.1f} ms "
+                  f"{peak_memory / 1024:>12.0f} KiB", flush=True)
+    return results
+
+
+def compare_results(results: list[dict[str, any]], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path, encoding="utf_8") as baseline_file:
+        baseline: dict[tuple[str, float, str], dict[str, any]] = {
+            (result["vary"], result["value"], result["stage"]): result for result in json.load(baseline_file)}
+    regressed: bool = False
+    print(f"\nCompared with {baseline_path} (regressions are over {tolerance:.0%} slower or larger):")
+    for result in results:
+        key: tuple[str, float, str] = (result["vary"], result["value"], result["stage"])
+        if key not in baseline:
+            continue
+        time_ratio: float = result["seconds"] / max(baseline[key]["seconds"], 1e-9)
+        memory_ratio: float = result["peak_memory"] / max(baseline[key]["peak_memory"], 1)
+        is_regression: bool = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        regressed = regressed or is_regression
+        print(f"{result['vary']} = {result['value']:<8} {result['stage']:<18} time {time_ratio:>6.2f}x "
+              f"memory {memory_ratio:>6.2f}x" + ("  REGRESSION" if is_regression else ""))
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the conversion pipeline and each logic stage on synthetic "
+                                                 "worlds of growing size, to record how they scale.")
+    parser.add_argument("--vary", choices=list(VARIABLE_SETTINGS), default="locations",
+                        help="The world setting to grow along the curve. Defaults to locations.")
+    parser.add_argument("--values", type=float, nargs="+",
+                        help="The values of the varied setting to measure at. Defaults depend on the setting.")
+    parser.add_argument("--stages", nargs="+",
+                        choices=["parse_logic", "convert_to_dnf", "reduce_logic", "region logic", "full conversion"],
+                        help="Only run these stages. Defaults to all of them.")
+    parser.add_argument("--region_logic", choices=["paths", "fixed_point"], default="paths",
+                        help="The region logic mode to benchmark. Defaults to paths.")
+    parser.add_argument("--max_dnf_clauses", type=int, default=0,
+                        help="The converter's --max_dnf_clauses. Defaults to 0, which always expands.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per stage; the best is reported.")
+    parser.add_argument("--output", help="A JSON file to save the results to, for use as a later --baseline.")
+    parser.add_argument("--baseline", help="A JSON file of earlier results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="How much slower or larger than the baseline a result may be before it is reported as "
+                             "a regression, as a fraction. Defaults to 0.2.")
+    add_world_settings_arguments(parser)
+    args = parser.parse_args()
+    benchmark_results: list[dict[str, any]] = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w', encoding="utf_8") as output_file:
+            json.dump(benchmark_results, output_file, indent=4)
+    if args.baseline and compare_results(benchmark_results, args.baseline, args.tolerance):
+        sys.exit(1)
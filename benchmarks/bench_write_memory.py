@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from files import *
+
+
+# The string-building writers that the streaming ones replaced, kept here as the benchmark baseline.
+def legacy_write_json_file(json_object: any, pack_root: str, file_location: str) -> None:
+    full_filepath: str = os.path.join(pack_root, file_location)
+    if not os.path.exists(os.path.dirname(full_filepath)):
+        os.makedirs(os.path.dirname(full_filepath))
+    with open(full_filepath, 'w', encoding="utf_8") as file:
+        json_dump = json.dumps(json_object, indent=4)
+        file.write(json_dump)
+
+
+def legacy_write_location_mapping_script(locations: list[dict[str, any]],
+                                         starting_index: int,
+                                         pack_root: str,
+                                         dense: bool = False) -> None:
+    full_filepath: str = os.path.join(pack_root, "legacy/location_mapping.lua")
+    if not os.path.exists(os.path.dirname(full_filepath)):
+        os.makedirs(os.path.dirname(full_filepath))
+    section_identifiers: dict[int, str] = {}
+    calculated_location_id: int = starting_index
+    for location in locations:
+        if "id" in location and location["id"] > calculated_location_id:
+            calculated_location_id = location["id"]
+        section_identifier: str = f"{location['category'][0].replace('/', '-')}/" \
+                                  f"{location['region'].replace('/', '-')}/" \
+                                  f"{location['name'].replace('/', '-')}"
+        section_identifiers[calculated_location_id] = section_identifier
+        calculated_location_id += 1
+    location_to_id_string: str = "LOCATION_TO_ID_MAP = {\n"
+    for location_id, section_identifier in section_identifiers.items():
+        location_to_id_string += f"    [\"{section_identifier}\"] = {location_id},\n"
+    location_to_id_string += "}\n"
+    if dense:
+        first_id, last_id = get_dense_id_run(list(section_identifiers.keys()))
+        id_to_location_string: str = f"LOCATION_ID_OFFSET = {first_id - 1}\nLOCATION_CODES = {{\n"
+        for location_id in range(first_id, last_id + 1):
+            if location_id in section_identifiers:
+                id_to_location_string += f"    \"@{section_identifiers[location_id]}\",\n"
+            else:
+                id_to_location_string += "    false,\n"
+        id_to_location_string += "}\nID_TO_LOCATION_MAP = {\n"
+        for location_id, section_identifier in section_identifiers.items():
+            if location_id < first_id or location_id > last_id:
+                id_to_location_string += f"    [{location_id}] = \"@{section_identifier}\",\n"
+        id_to_location_string += "}\n"
+        id_to_location_string += DENSE_LOCATION_MAPPING_ACCESSORS
+    else:
+        id_to_location_string: str = "ID_TO_LOCATION_MAP = {\n"
+        for location_id, section_identifier in section_identifiers.items():
+            id_to_location_string += f"    [{location_id}] = {{\"@{section_identifier}\"}},\n"
+        id_to_location_string += "}\n"
+        id_to_location_string += LOCATION_MAPPING_ACCESSORS
+    with open(full_filepath, 'w', encoding="utf_8") as file:
+        file.write(location_to_id_string + id_to_location_string)
+
+
+def build_world(location_count: int) -> tuple[list[dict[str, any]], list[dict[str, any]]]:
+    locations: list[dict[str, any]] = []
+    poptracker_locations: list[dict[str, any]] = []
+    for i in range(location_count):
+        # some names have slashes, which both writers replace in section identifiers
+        locations.append({"name": f"Location {i}" + (" / Alt" if i % 10 == 0 else ""),
+                          "category": [f"Category {i % 20}"],
+                          "region": f"Region {i % 200}" + ("/Upper" if i % 7 == 0 else "")})
+        poptracker_locations.append({
+            "name": f"Location {i}",
+            "access_rules": [f"item_{i % 97},item_{i % 89}", f"$has_count_from_group|Group {i % 13}|{i % 7}"],
+            "sections": [{"name": f"Location {i}", "item_count": 1}],
+            "map_locations": [{"map": "Category", "x": 5 + (i % 50) * 30, "y": 5 + (i // 50) * 30}]
+        })
+    return locations, [{"name": "Locations", "children": poptracker_locations}]
+
+
+def measure_peak(function, *function_args) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function(*function_args)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def check_same_output(pack_root: str, legacy_location: str, new_location: str, description: str) -> None:
+    with open(os.path.join(pack_root, legacy_location), encoding="utf_8") as legacy_file, \
+            open(os.path.join(pack_root, new_location), encoding="utf_8") as new_file:
+        if legacy_file.read() != new_file.read():
+            raise AssertionError(f"Writers disagree on {description}")
+
+
+def run_case(location_count: int, pack_root: str) -> None:
+    pack: PackWriter = PackWriter(pack_root)
+    locations, locations_json = build_world(location_count)
+    legacy_json_peak: int = measure_peak(legacy_write_json_file, locations_json, pack_root, "legacy/locations.json")
+    json_peak: int = measure_peak(write_json_file, locations_json, pack, "locations/locations.json")
+    check_same_output(pack_root, "legacy/locations.json", "locations/locations.json",
+                      f"the locations file for {location_count} locations")
+    # the dense layout is only checked, so the peaks compare the default layout the old benchmark measured
+    legacy_write_location_mapping_script(locations, 1, pack_root, True)
+    write_location_mapping_script(locations, 1, pack, True)
+    check_same_output(pack_root, "legacy/location_mapping.lua", "scripts/archipelago/location_mapping.lua",
+                      f"the dense location mapping for {location_count} locations")
+    legacy_lua_peak: int = measure_peak(legacy_write_location_mapping_script, locations, 1, pack_root)
+    lua_peak: int = measure_peak(write_location_mapping_script, locations, 1, pack)
+    check_same_output(pack_root, "legacy/location_mapping.lua", "scripts/archipelago/location_mapping.lua",
+                      f"the location mapping for {location_count} locations")
+    print(f"{location_count:>10} {legacy_json_peak / 1024:>14.0f} {json_peak / 1024:>12.0f} "
+          f"{legacy_lua_peak / 1024:>14.0f} {lua_peak / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the peak memory of the streaming pack writers against the "
+                                                 "previous string-building writers.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Numbers of locations to write.")
+    args = parser.parse_args()
+    print("Peak memory allocated while writing, in KiB")
+    print(f"{'locations':>10} {'legacy json':>14} {'new json':>12} {'legacy lua':>14} {'new lua':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            run_case(size, temp_dir)
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import random
+import zipfile
+from typing import NamedTuple
+
+WORLD_FILE_NAMES: list[str] = ["items", "locations", "regions", "categories", "game", "options"]
+
+
+class WorldSettings(NamedTuple):
+    location_count: int = 1000
+    region_count: int = 15
+    # forward connections from each region; every region also keeps one connection to the next, so all are reachable
+    connections_per_region: int = 2
+    # chance for each region to also connect back to an earlier region, which makes cycles in the region graph
+    cycle_chance: float = 0.2
+    # how many levels of nested and/or a location's and a region's rule may have, and how many choices each or offers;
+    # region rules multiply along every path to a region, so they are kept shallow by default
+    rule_depth: int = 3
+    region_rule_depth: int = 1
+    or_fan_out: int = 3
+    item_count: int = 60
+    item_group_size: int = 10
+    category_count: int = 10
+    # chance for each term of a rule to be an {ItemValue} or {YamlCompare} call instead of an item
+    item_value_chance: float = 0.05
+    yaml_compare_chance: float = 0.05
+    # chance for a location or region to have any requirement at all
+    rule_chance: float = 0.8
+    seed: int = 1
+
+
+def build_term(settings: WorldSettings, rng: random.Random) -> str:
+    roll: float = rng.random()
+    if roll < settings.item_value_chance:
+        return f"{{ItemValue(Coins:{rng.randint(1, 10)})}}"
+    roll -= settings.item_value_chance
+    if roll < settings.yaml_compare_chance:
+        return f"{{YamlCompare(difficulty>={rng.randint(1, 3)})}}"
+    roll -= settings.yaml_compare_chance
+    group_count: int = max(1, settings.item_count // settings.item_group_size)
+    if roll < 0.15:
+        return f"|@Group {rng.randrange(group_count)}:{rng.randint(1, settings.item_group_size)}|"
+    if roll < 0.25:
+        return f"|Item {rng.randrange(settings.item_count)}:{rng.randint(2, 3)}|"
+    return f"|Item {rng.randrange(settings.item_count)}|"
+
+
+def build_rule(settings: WorldSettings, rng: random.Random, max_depth: int, depth: int = 0) -> str:
+    if depth >= max_depth or (depth > 0 and rng.random() < 0.3):
+        return build_term(settings, rng)
+    # levels alternate between or and and, so the depth is the real nesting depth of the parsed rule
+    if (depth + rng.randint(0, 1)) % 2 == 0:
+        operands: list[str] = [build_rule(settings, rng, max_depth, depth + 1) for _ in range(settings.or_fan_out)]
+        rule: str = " or ".join(operands)
+    else:
+        operands: list[str] = [build_rule(settings, rng, max_depth, depth + 1) for _ in range(2)]
+        rule: str = " and ".join(operands)
+    return rule if depth == 0 else f"({rule})"
+
+
+def generate_world(settings: WorldSettings) -> dict[str, any]:
+    rng: random.Random = random.Random(settings.seed)
+    items: list[dict[str, any]] = []
+    for item_index in range(settings.item_count):
+        item: dict[str, any] = {"name": f"Item {item_index}", "progression": True,
+                                "category": [f"Group {item_index // settings.item_group_size}"]}
+        if item_index % 4 == 0:
+            item["count"] = 3
+        if item_index % 5 == 0:
+            item["value"] = {"Coins": item_index % 3 + 1}
+        items.append(item)
+    items.append({"name": "Filler", "category": ["Filler"], "count": 10})
+
+    region_names: list[str] = [f"Region {region_index}" for region_index in range(settings.region_count)]
+    regions: dict[str, any] = {}
+    for region_index, region_name in enumerate(region_names):
+        later_regions: list[str] = region_names[region_index + 1:]
+        connections: list[str] = later_regions[:1] + rng.sample(later_regions[1:], k=min(
+            max(settings.connections_per_region - 1, 0), len(later_regions) - 1 if later_regions else 0))
+        if region_index > 0 and rng.random() < settings.cycle_chance:
+            connections.append(rng.choice(region_names[:region_index]))
+        has_rule: bool = region_index > 0 and rng.random() < settings.rule_chance
+        regions[region_name] = {"connects_to": connections, "starting": region_index == 0,
+                                "requires": build_rule(settings, rng, settings.region_rule_depth) if has_rule else ""}
+
+    locations: list[dict[str, any]] = []
+    for location_index in range(settings.location_count):
+        location: dict[str, any] = {"name": f"Location {location_index}", "region": rng.choice(region_names),
+                                    "category": [f"Category {location_index % settings.category_count}"]}
+        if rng.random() < settings.rule_chance:
+            location["requires"] = build_rule(settings, rng, settings.rule_depth)
+        locations.append(location)
+
+    categories: dict[str, any] = {"Category 1": {"yaml_option": ["include_extras"]},
+                                  "Category 2": {"yaml_option": ["!skip_hard"]}}
+    game: dict[str, any] = {"game": "Synthetic", "creator": "Benchmark"}
+    options: dict[str, any] = {"user": {"difficulty": {"type": "Range", "range_start": 0, "range_end": 3},
+                                        "include_extras": {"type": "Toggle"},
+                                        "skip_hard": {"type": "Toggle"}}}
+    return {"items": items, "locations": locations, "regions": regions, "categories": categories, "game": game,
+            "options": options}
+
+
+def write_world(world: dict[str, any], output_path: str) -> None:
+    # a path ending in .apworld gets a zipped APWorld, anything else a folder with a data/ directory
+    if output_path.endswith(".apworld"):
+        if os.path.dirname(output_path) and not os.path.exists(os.path.dirname(output_path)):
+            os.makedirs(os.path.dirname(output_path))
+        world_name: str = os.path.splitext(os.path.basename(output_path))[0]
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as apworld:
+            for file_name in WORLD_FILE_NAMES:
+                apworld.writestr(f"{world_name}/data/{file_name}.json", json.dumps(world[file_name], indent=4))
+        return
+    os.makedirs(os.path.join(output_path, "data"), exist_ok=True)
+    for file_name in WORLD_FILE_NAMES:
+        with open(os.path.join(output_path, "data", f"{file_name}.json"), 'w', encoding="utf_8") as file:
+            json.dump(world[file_name], file, indent=4)
+
+
+def add_world_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults: WorldSettings = WorldSettings()
+    parser.add_argument("--locations", type=int, default=defaults.location_count, help="Number of locations.")
+    parser.add_argument("--regions", type=int, default=defaults.region_count, help="Number of regions.")
+    parser.add_argument("--connections", type=int, default=defaults.connections_per_region,
+                        help="Forward connections from each region; higher is denser.")
+    parser.add_argument("--cycle_chance", type=float, default=defaults.cycle_chance,
+                        help="Chance for each region to connect back to an earlier one.")
+    parser.add_argument("--rule_depth", type=int, default=defaults.rule_depth, help="Maximum nesting depth of rules.")
+    parser.add_argument("--region_rule_depth", type=int, default=defaults.region_rule_depth,
+                        help="Maximum nesting depth of region rules.")
+    parser.add_argument("--or_fan_out", type=int, default=defaults.or_fan_out, help="Number of choices in each or.")
+    parser.add_argument("--items", type=int, default=defaults.item_count, help="Number of progression items.")
+    parser.add_argument("--item_group_size", type=int, default=defaults.item_group_size,
+                        help="Number of items in each item group.")
+    parser.add_argument("--categories", type=int, default=defaults.category_count,
+                        help="Number of location categories.")
+    parser.add_argument("--item_value_chance", type=float, default=defaults.item_value_chance,
+                        help="Chance for a rule term to be an {ItemValue} call.")
+    parser.add_argument("--yaml_compare_chance", type=float, default=defaults.yaml_compare_chance,
+                        help="Chance for a rule term to be a {YamlCompare} call.")
+    parser.add_argument("--rule_chance", type=float, default=defaults.rule_chance,
+                        help="Chance for a location or region to have a requirement.")
+    parser.add_argument("--seed", type=int, default=defaults.seed,
+                        help="Random seed; the same seed gives the same world.")
+
+
+def get_world_settings(args: argparse.Namespace) -> WorldSettings:
+    return WorldSettings(location_count=args.locations, region_count=args.regions,
+                         connections_per_region=args.connections, cycle_chance=args.cycle_chance,
+                         rule_depth=args.rule_depth, region_rule_depth=args.region_rule_depth,
+                         or_fan_out=args.or_fan_out, item_count=args.items,
+                         item_group_size=args.item_group_size, category_count=args.categories,
+                         item_value_chance=args.item_value_chance, yaml_compare_chance=args.yaml_compare_chance,
+                         rule_chance=args.rule_chance, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Manual APWorld of a chosen size and shape.")
+    parser.add_argument("output_path", help="Where to write the APWorld: a folder, or a file ending in .apworld.")
+    add_world_settings_arguments(parser)
+    args = parser.parse_args()
+    write_world(generate_world(get_world_settings(args)), args.output_path)
@@ -1,74 +1,199 @@
 import argparse
+import concurrent.futures
+import copy
+import cProfile
+import io
 import json
 import os
+import time
 import zipfile as zip
+from typing import NamedTuple
 
 from files import *
 from items import *
 from locations import *
 from options import *
+from profiling import *
 from utils import to_snake_case
 
-if __name__ == "__main__":
+WORLD_FILE_NAMES: list[str] = ["items", "locations", "regions", "categories", "game", "options"]
+
+
+class ConvertedGroup(NamedTuple):
+    locations: list[dict[str, any]]
+    square_offset: int
+    poptracker_locations: list[dict[str, any]]
+    map_names: set[str]
+    functions: dict[str, int]
+    factored_rules: dict[str, str]
+    factored_locations: list[str]
+
+
+class AccessRulesSizes(NamedTuple):
+    regions: dict[str, int]
+    # (group, region entry name, section name) -> size
+    sections: dict[tuple[str, str, str], int]
+
+
+class ConversionState(NamedTuple):
+    world: dict[str, any]
+    item_groups: dict[str, list[str]]
+    region_graph: dict[str, list[str]]
+    visibility_options: dict[str, list[str]]
+    region_logic_table: RegionLogicTable
+    rule_cache: RuleCache
+    groups: dict[str, ConvertedGroup]
+    rebuilt_groups: list[str]
+    functions: dict[str, int]
+    factored_locations: list[str]
+    shared_rule_count: int
+    access_rules_sizes: AccessRulesSizes
+
+
+def add_conversion_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--author", help="The name to use as the author of the PopTracker pack")
+    parser.add_argument("--region_logic", choices=["paths", "fixed_point"], default="paths",
+                        help="How to compute region access rules. \"paths\" enumerates every path from the starting "
+                             "regions, which can be very slow on densely connected worlds. \"fixed_point\" computes "
+                             "each region's rules once over the region graph. The two are not output-identical: "
+                             "\"paths\" ignores paths with no requirements, so a region that is also reachable for "
+                             "free keeps the rules of its other paths, while \"fixed_point\" leaves it without rules.")
+    parser.add_argument("--rule_cache", help="A file to keep converted logic rules in between runs. Rules that are "
+                                             "unchanged since the last run are read from it instead of being "
+                                             "converted again. Created if it does not already exist.")
+    parser.add_argument("--rule_cache_size", type=int, default=4096,
+                        help="The maximum number of converted logic rules to keep cached. Defaults to 4096.")
+    parser.add_argument("--max_dnf_clauses", type=int, default=0,
+                        help="The largest number of clauses a location's logic may expand to. Logic that would "
+                             "expand further is written as a Lua function in scripts/factored_rules.lua instead. "
+                             "Defaults to 0, which always expands, as the converter always has.")
+    parser.add_argument("--compile_rules", action="store_true",
+                        help="Compile each access rule list into a Lua function in scripts/compiled_rules.lua, which "
+                             "PopTracker can evaluate faster than the rule strings.")
+    parser.add_argument("--shared_rules", action="store_true",
+                        help="Write each access rule list that is used more than once a single time, as a hidden "
+                             "location that every user of the rule references.")
+    parser.add_argument("--dense_mappings", action="store_true",
+                        help="Write the Archipelago id mappings as arrays indexed from the first id instead of as hash "
+                             "tables, which use less memory and are faster to look up when ids are contiguous.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write minified JSON and generated Lua without indentation or comments, to make the pack "
+                             "smaller and faster for PopTracker to load.")
+    parser.add_argument("--zip", action="store_true",
+                        help="Write the pack as a single .zip archive at the output path, with \".zip\" added if it "
+                             "is not already there, instead of as a folder. Images already in the archive are kept, "
+                             "as they are in a folder.")
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Manual APWorld to PopTracker Pack converter.")
     parser.add_argument("apworld_path", help="The full path to the Manual APWorld you want to convert.")
     parser.add_argument("--output_path", help="The output directory to build the PopTracker pack in. If not provided, "
                                               "will default to a folder named poptracker in the directory containing the"
                                               " APWorld.")
-    parser.add_argument("--author", help="The name to use as the author of the PopTracker pack")
-    args = parser.parse_args()
-    if not os.path.isabs(args.apworld_path):
-        args.apworld_path = os.path.abspath(args.apworld_path)
+    add_conversion_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="The number of processes to convert location groups with in parallel. The pack is the "
+                             "same whatever the number. Defaults to 1.")
+    parser.add_argument("--watch", action="store_true",
+                        help="After converting, keep watching the APWorld's data files and convert again whenever "
+                             "they change, rebuilding only the location groups the change affects.")
+    parser.add_argument("--watch_interval", type=float, default=1.0,
+                        help="How often to check the data files for changes in watch mode, in seconds. Defaults to 1.")
+    parser.add_argument("--complexity_report",
+                        help="A file to write a report of how complex each location's and region's logic is to, as "
+                             "CSV if the file name ends in .csv and as JSON otherwise.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each phase of the conversion and report its wall time, call count and peak memory, "
+                             "along with the locations and regions whose rules took longest to convert.")
+    parser.add_argument("--profile_top", type=int, default=10,
+                        help="The number of slowest locations and regions to list with --profile. Defaults to 10.")
+    parser.add_argument("--profile_stats",
+                        help="A file to write cProfile statistics of the conversion to, for use with pstats or "
+                             "snakeviz.")
+    return parser
+
+
+def get_default_output_path(apworld_path: str) -> str:
+    if zip.is_zipfile(apworld_path):
+        return os.path.join(os.path.split(apworld_path)[0], "poptracker")
+    return os.path.join(apworld_path, "tracker")
+
+
+def find_world_data_folder(apworld: zip.ZipFile) -> str:
+    # the data files sit in a folder named after the APWorld, which is unknown when only its contents are given
+    for file_name in apworld.namelist():
+        if file_name.endswith("/data/items.json") and file_name.count("/") == 2:
+            return file_name[:-len("items.json")]
+    raise FileNotFoundError("The APWorld has no data/items.json file")
+
+
+def read_world_archive(apworld: zip.ZipFile, data_folder: str) -> dict[str, str]:
+    return {file_name: apworld.read(f"{data_folder}{file_name}.json").decode("utf-8") for file_name in WORLD_FILE_NAMES}
+
+
+@profiled
+def read_world_files(apworld_path: str) -> dict[str, str]:
     # Confirm the .apworld path is correct, and points to a zip file
-    if zip.is_zipfile(args.apworld_path):
-        apworld_name: str = os.path.splitext(os.path.basename(args.apworld_path))[0]
-        if not args.output_path:
-            apworld_dir: str = os.path.split(args.apworld_path)[0]
-            args.output_path = os.path.join(apworld_dir, "poptracker")
+    if zip.is_zipfile(apworld_path):
+        apworld_name: str = os.path.splitext(os.path.basename(apworld_path))[0]
         # Read the relevant JSON files
-        with zip.ZipFile(args.apworld_path) as apworld:
-            items_json = apworld.read(f"{apworld_name}/data/items.json").decode("utf-8")
-            locations_json = apworld.read(f"{apworld_name}/data/locations.json").decode("utf-8")
-            regions_json = apworld.read(f"{apworld_name}/data/regions.json").decode("utf-8")
-            categories_json = apworld.read(f"{apworld_name}/data/categories.json").decode("utf-8")
-            game_json = apworld.read(f"{apworld_name}/data/game.json").decode("utf-8")
-            options_json = apworld.read(f"{apworld_name}/data/options.json").decode("utf-8")
+        with zip.ZipFile(apworld_path) as apworld:
+            return read_world_archive(apworld, f"{apworld_name}/data/")
+    world_files: dict[str, str] = {}
+    for file_name in WORLD_FILE_NAMES:
+        with open(os.path.join(apworld_path, "data", f"{file_name}.json"), "r", encoding="utf-8") as f:
+            world_files[file_name] = f.read()
+    return world_files
+
+
+def get_world_file_times(apworld_path: str) -> dict[str, float]:
+    if zip.is_zipfile(apworld_path):
+        filepaths: list[str] = [apworld_path]
     else:
-        apworld_name = os.path.split(args.apworld_path)[1]
-        if not args.output_path:
-            args.output_path = os.path.join(args.apworld_path, "tracker")
-
-        with open(os.path.join(args.apworld_path, "data", "items.json"), "r", encoding="utf-8") as f:
-            items_json = f.read()
-        with open(os.path.join(args.apworld_path, "data", "locations.json"), "r", encoding="utf-8") as f:
-            locations_json = f.read()
-        with open(os.path.join(args.apworld_path, "data", "regions.json"), "r", encoding="utf-8") as f:
-            regions_json = f.read()
-        with open(os.path.join(args.apworld_path, "data", "categories.json"), "r", encoding="utf-8") as f:
-            categories_json = f.read()
-        with open(os.path.join(args.apworld_path, "data", "game.json"), "r", encoding="utf-8") as f:
-            game_json = f.read()
-        with open(os.path.join(args.apworld_path, "data", "options.json"), "r", encoding="utf-8") as f:
-            options_json = f.read()
-
-    items = json.loads(items_json)
-    locations = json.loads(locations_json)
-    regions = json.loads(regions_json)
-    categories = json.loads(categories_json)
-    game = json.loads(game_json)
-    options = json.loads(options_json)
-
-    for location in locations:
+        filepaths: list[str] = [os.path.join(apworld_path, "data", f"{file_name}.json") for file_name in WORLD_FILE_NAMES]
+    file_times: dict[str, float] = {}
+    for filepath in filepaths:
+        try:
+            file_times[filepath] = os.stat(filepath).st_mtime
+        except OSError:
+            file_times[filepath] = -1
+    return file_times
+
+
+@profiled
+def parse_world(world_files: dict[str, str]) -> dict[str, any]:
+    world: dict[str, any] = {file_name: json.loads(world_files[file_name]) for file_name in WORLD_FILE_NAMES}
+    for location in world["locations"]:
         if "region" not in location:
             location["region"] = "__start__"
+    return world
+
+
+def create_pack_writer(args: argparse.Namespace) -> PackWriter:
+    if args.zip:
+        return ZipPackWriter(args.output_path, args.compact)
+    return PackWriter(args.output_path, args.compact)
+
+
+def convert_world(world: dict[str, any],
+                  args: argparse.Namespace,
+                  pack: PackWriter,
+                  previous_state: ConversionState | None = None) -> ConversionState:
+    items: list[dict[str, any]] = world["items"]
+    locations: list[dict[str, any]] = world["locations"]
+    regions: dict[str, any] = world["regions"]
+    categories: dict[str, any] = world["categories"]
+    game: dict[str, any] = world["game"]
+    options: dict[str, any] = world["options"]
 
     poptracker_items: list[dict[str, any]]
     item_values: dict[str, dict[str, int]]
     poptracker_items, item_values = parse_items(items)
     item_groups: dict[str, list[str]] = get_item_groups(items)
     input_layout: list[dict[str, any]] = build_item_layout(item_groups, 10)
-    write_json_file(poptracker_items, args.output_path, "items/items.json")
-    write_json_file(input_layout, args.output_path, "layouts/input_layout.json")
+    write_json_file(poptracker_items, pack, "items/items.json")
+    write_json_file(input_layout, pack, "layouts/input_layout.json")
 
     region_graph: dict[str, list[str]] = build_region_graph(regions)
     regions["__start__"] = {}
@@ -83,40 +208,156 @@ if __name__ == "__main__":
                 visibility_options[category].append(option_name)
                 category_options.add(option_name.lstrip("!"))
 
+    # Converted groups from the previous run can be reused as long as the item groups their rules were converted with
+    # are the same, and nothing the group depends on has changed
+    if previous_state is not None and previous_state.item_groups != item_groups:
+        previous_state = None
+    affected_regions: set[str] = set()
+    changed_categories: set[str] = set()
+    if previous_state is not None:
+        rule_cache: RuleCache = previous_state.rule_cache
+        rule_cache.hits = rule_cache.misses = 0
+        if previous_state.world["regions"] == regions:
+            region_logic_table: RegionLogicTable = previous_state.region_logic_table
+            region_logic_table.hits = region_logic_table.misses = 0
+        else:
+            affected_regions = get_affected_regions(previous_state.world["regions"], regions,
+                                                    previous_state.region_graph, region_graph)
+            region_logic_table: RegionLogicTable = RegionLogicTable(regions, region_graph, item_groups,
+                                                                    args.region_logic)
+        changed_categories = {category for category in previous_state.visibility_options.keys() |
+                              visibility_options.keys()
+                              if previous_state.visibility_options.get(category) != visibility_options.get(category)}
+    else:
+        region_logic_table: RegionLogicTable = RegionLogicTable(regions, region_graph, item_groups, args.region_logic)
+        rule_cache: RuleCache = RuleCache(item_groups, args.rule_cache_size, args.max_dnf_clauses)
+        if args.rule_cache:
+            rule_cache.load(os.path.abspath(args.rule_cache))
+
     poptracker_option_items: list[dict[str, any]] = build_option_items(options, category_options)
-    write_json_file(poptracker_option_items, args.output_path, "items/options.json")
+    write_json_file(poptracker_option_items, pack, "items/options.json")
     poptracker_option_layout: dict[str, any] = build_option_layout(poptracker_option_items)
-    write_json_file(poptracker_option_layout, args.output_path, "layouts/options_layout.json")
+    write_json_file(poptracker_option_layout, pack, "layouts/options_layout.json")
 
     total_square_count: int = 0
+    groups_to_build: list[tuple[list[dict[str, any]], int, str]] = []
+    converted_groups: dict[str, ConvertedGroup] = {}
+    for group, locations_in_group in grouped_locations.items():
+        previous_group: ConvertedGroup | None = previous_state.groups.get(group) if previous_state else None
+        if (previous_group is None or previous_group.square_offset != total_square_count or
+                previous_group.locations != locations_in_group or
+                any(location["region"] in affected_regions or
+                    any(category in changed_categories for category in location.get("category", []))
+                    for location in locations_in_group)):
+            groups_to_build.append((locations_in_group, total_square_count, group))
+        else:
+            converted_groups[group] = previous_group
+        total_square_count += count_location_squares(locations_in_group)
+
+    built_results: list[tuple[int, set[str], list[dict[str, any]], dict[str, int], dict[str, str], list[str]]] = []
+    if args.jobs > 1 and len(groups_to_build) > 1:
+        worker_args: tuple = (regions, region_graph, item_groups, visibility_options, args.region_logic,
+                              args.rule_cache_size, args.max_dnf_clauses, rule_cache.get_entries())
+        # the work done inside the worker processes is not broken down further when profiling
+        with (profile_phase("build_locations_json in workers"),
+              concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, initializer=init_locations_worker,
+                                                     initargs=worker_args) as executor):
+            # region rules are converted once up front and handed to each group, instead of every worker converting
+            # every region its groups use
+            regions_to_convert: list[str] = region_logic_table.get_uncached_regions(list(dict.fromkeys(
+                location["region"] for locations_in_group, _, _ in groups_to_build for location in locations_in_group)))
+            if args.region_logic == "paths":
+                region_results = list(executor.map(get_region_access_rules_in_worker, regions_to_convert))
+                region_logic_table.import_access_rules({region: region_results[index][0]
+                                                        for index, region in enumerate(regions_to_convert)})
+                region_logic_table.import_logic_counts({region: region_results[index][1]
+                                                        for index, region in enumerate(regions_to_convert)})
+                region_logic_table.misses += len(regions_to_convert)
+            else:
+                for region in regions_to_convert:
+                    region_logic_table.get_access_rules(region)
+            worker_results = executor.map(build_locations_json_in_worker,
+                                          [group_args[0] for group_args in groups_to_build],
+                                          [group_args[1] for group_args in groups_to_build],
+                                          [group_args[2] for group_args in groups_to_build],
+                                          [region_logic_table.export_access_rules(list(dict.fromkeys(
+                                              location["region"] for location in group_args[0])))
+                                           for group_args in groups_to_build])
+            # map hands results back in group order, the same order a serial run converts them in
+            for result, new_rule_cache_entries, cache_counts in worker_results:
+                built_results.append(result)
+                rule_cache.add_entries(new_rule_cache_entries)
+                region_logic_table.hits += cache_counts[0]
+                rule_cache.hits += cache_counts[2]
+                rule_cache.misses += cache_counts[3]
+            # the first lookup of each converted region would have been a miss in a serial run
+            region_logic_table.hits -= len(regions_to_convert)
+    else:
+        for locations_in_group, square_offset, group in groups_to_build:
+            built_results.append(build_locations_json(locations_in_group, regions, region_logic_table, rule_cache,
+                                                      visibility_options, square_offset, group))
+    for index, (locations_in_group, square_offset, group) in enumerate(groups_to_build):
+        _, new_map_names, poptracker_locations, new_functions, new_factored_rules, new_factored_locations = \
+            built_results[index]
+        converted_groups[group] = ConvertedGroup(locations_in_group, square_offset, poptracker_locations, new_map_names,
+                                              new_functions, new_factored_rules, new_factored_locations)
+    groups: dict[str, ConvertedGroup] = {group: converted_groups[group] for group in grouped_locations}
+    rebuilt_groups: list[str] = [group for _, _, group in groups_to_build]
+
     locations_file_paths: list[str] = []
+    locations_jsons: list[list[dict[str, any]]] = []
     map_names: set[str] = set()
     functions: dict[str, int] = {}
-    for group, locations_in_group in grouped_locations.items():
-        total_square_count, new_map_names, poptracker_locations, new_functions = \
-            build_locations_json(locations_in_group, regions, region_graph, item_groups, visibility_options,
-                                 total_square_count, group)
-        locations_file_path: str = f"locations/{to_snake_case(group)}.json"
-        locations_file_paths.append(locations_file_path)
-        write_json_file(poptracker_locations, args.output_path, locations_file_path)
-        map_names |= new_map_names
-        functions |= new_functions
+    factored_rules: dict[str, str] = {}
+    factored_locations: list[str] = []
+    for group, converted_group in groups.items():
+        locations_file_paths.append(f"locations/{to_snake_case(group)}.json")
+        # compiling and sharing rules rewrite the locations in place, so groups kept for watch mode are copied first
+        if args.watch and (args.compile_rules or args.shared_rules):
+            locations_jsons.append(copy.deepcopy(converted_group.poptracker_locations))
+        else:
+            locations_jsons.append(converted_group.poptracker_locations)
+        map_names |= converted_group.map_names
+        functions |= converted_group.functions
+        factored_rules |= converted_group.factored_rules
+        factored_locations.extend(converted_group.factored_locations)
+    # measured before compiling and sharing rules replace them with references to the rules
+    access_rules_sizes: AccessRulesSizes = get_access_rules_sizes(groups)
+    compiled_rules: dict[str, str] = {}
+    if args.compile_rules:
+        compiled_rules = compile_access_rules(locations_jsons, item_groups, item_values)
+    shared_rule_count: int = 0
+    if args.shared_rules:
+        shared_rules_json: list[dict[str, any]] = share_access_rules(locations_jsons)
+        shared_rule_count = len(shared_rules_json[0]["children"])
+        locations_file_paths.insert(0, f"locations/{SHARED_RULES_LOCATION}.json")
+        locations_jsons.insert(0, shared_rules_json)
+    for index, locations_file_path in enumerate(locations_file_paths):
+        write_json_file(locations_jsons[index], pack, locations_file_path)
     poptracker_maps: list[dict[str, any]] = build_maps_json(map_names)
-    write_json_file(poptracker_maps, args.output_path, "maps/maps.json")
+    write_json_file(poptracker_maps, pack, "maps/maps.json")
     poptracker_map_layouts: dict[str, any] = build_map_tabs_layout(map_names)
-    write_json_file(poptracker_map_layouts, args.output_path, "layouts/map_layouts.json")
+    write_json_file(poptracker_map_layouts, pack, "layouts/map_layouts.json")
+
+    if args.rule_cache:
+        rule_cache.save(os.path.abspath(args.rule_cache))
 
     if len(functions) > 0:
-        write_custom_util_lua_file(functions, args.output_path)
-    write_lua_init_file(locations_file_paths, len(functions) > 0, args.output_path)
+        write_custom_util_lua_file(functions, pack)
+    if factored_rules:
+        write_factored_rules_lua_file(factored_rules, pack)
+    if compiled_rules:
+        write_compiled_rules_lua_file(compiled_rules, pack)
+    write_lua_init_file(locations_file_paths, len(functions) > 0, len(factored_rules) > 0, len(compiled_rules) > 0,
+                        pack)
 
     game_name: str = f"Manual_{game['game']}_{game['creator']}"
 
     starting_index: int = game["starting_index"] if "starting_index" in game else 1
-    write_data_lua_script(item_groups, item_values, options, args.output_path)
-    write_item_mapping_script(items, starting_index, args.output_path)
-    write_location_mapping_script(locations, starting_index, args.output_path)
-    copy_default_files(items, poptracker_option_items, map_names, args.output_path)
+    write_data_lua_script(item_groups, item_values, options, pack)
+    write_item_mapping_script(items, starting_index, pack, args.dense_mappings)
+    write_location_mapping_script(locations, starting_index, pack, args.dense_mappings)
+    copy_default_files(items, poptracker_option_items, map_names, pack)
 
     tracker_json_object: dict[str, any] = {"display_name": "Map Tracker", "flags": ["ap", "apmanual"]}
     variants_json_object: dict[str, any] = {"tracker": tracker_json_object}
@@ -129,9 +370,83 @@ if __name__ == "__main__":
     }
     if args.author:
         manifest_json_object["author"] = args.author
-    write_json_file(manifest_json_object, args.output_path, "manifest.json")
+    write_json_file(manifest_json_object, pack, "manifest.json")
+    with profile_phase("close pack"):
+        pack.close()
+    return ConversionState(world, item_groups, region_graph, visibility_options, region_logic_table, rule_cache, groups,
+                           rebuilt_groups, functions, factored_locations, shared_rule_count, access_rules_sizes)
+
+
+def convert_apworld(args: argparse.Namespace) -> tuple[ConversionState, PackWriter]:
+    pack: PackWriter = create_pack_writer(args)
+    return convert_world(parse_world(read_world_files(args.apworld_path)), args, pack), pack
+
+
+def get_conversion_args(**options: any) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    add_conversion_arguments(parser)
+    args: argparse.Namespace = parser.parse_args([])
+    args.jobs = 1
+    args.watch = False
+    for option_name, value in options.items():
+        if option_name not in vars(args) or option_name == "zip":
+            raise TypeError(f"Unknown conversion option: {option_name}")
+        setattr(args, option_name, value)
+    if args.region_logic not in ["paths", "fixed_point"]:
+        raise ValueError(f"Unknown region logic mode: {args.region_logic}")
+    return args
+
+
+def convert_apworld_in_memory(apworld: str | bytes, **options: any) -> dict[str, bytes]:
+    # options are the command line arguments by name; the pack's files are returned by their paths in the pack
+    args: argparse.Namespace = get_conversion_args(**options)
+    if isinstance(apworld, bytes):
+        with zip.ZipFile(io.BytesIO(apworld)) as archive:
+            world_files: dict[str, str] = read_world_archive(archive, find_world_data_folder(archive))
+    else:
+        world_files: dict[str, str] = read_world_files(apworld)
+    pack: MemoryPackWriter = MemoryPackWriter(args.compact)
+    convert_world(parse_world(world_files), args, pack)
+    return pack.files
+
+
+def get_access_rules_size(access_rules: list[str]) -> int:
+    return sum(len(access_rule) for access_rule in access_rules)
+
+
+def get_access_rules_sizes(groups: dict[str, ConvertedGroup]) -> AccessRulesSizes:
+    sizes: AccessRulesSizes = AccessRulesSizes({}, {})
+    for group, converted_group in groups.items():
+        for top_level_json in converted_group.poptracker_locations:
+            for region_entry in top_level_json["children"]:
+                sizes.regions.setdefault(region_entry["name"], get_access_rules_size(region_entry["access_rules"]))
+                for section in region_entry["sections"]:
+                    sizes.sections[(group, region_entry["name"], section["name"])] = \
+                        get_access_rules_size(section.get("access_rules", []))
+    return sizes
 
-    if functions:
+
+def build_complexity_report(state: ConversionState) -> list[dict[str, any]]:
+    rows: list[dict[str, any]] = []
+    sizes: AccessRulesSizes = state.access_rules_sizes
+    for group, converted_group in state.groups.items():
+        for location in converted_group.locations:
+            rows.append({"kind": "location", "name": location["name"], "group": group, "region": location["region"]}
+                        | state.rule_cache.get_complexity(location.get("requires", ""))
+                        | {"region_paths": None,
+                           "access_rules_size": sizes.sections.get((group, location["region"].replace("/", "-"),
+                                                                    location["name"].replace("/", "-")), 0)})
+    for region in state.world["regions"]:
+        if region == "__start__":
+            continue
+        rows.append({"kind": "region", "name": region, "group": None, "region": region}
+                    | state.region_logic_table.get_complexity(region)
+                    | {"factored": False, "access_rules_size": sizes.regions.get(region.replace("/", "-"))})
+    return [{column: row[column] for column in COMPLEXITY_REPORT_COLUMNS} for row in rows]
+
+
+def print_summary(state: ConversionState, args: argparse.Namespace, pack: PackWriter) -> None:
+    if state.functions:
         opt_one_or_all_found: bool = False
         print("========================================================")
         print("| WARNING! You have custom logic hooks in your logic!  |")
@@ -140,7 +455,7 @@ if __name__ == "__main__":
         print("| your pack to work correctly!                         |")
         print("|                                                      |")
         print("| Custom functions found:                              |")
-        for function_name in sorted(functions.keys()):
+        for function_name in sorted(state.functions.keys()):
             if function_name in ["OptOne", "OptAll"]:
                 opt_one_or_all_found = True
                 continue
@@ -154,4 +469,83 @@ if __name__ == "__main__":
             print("| lua stubs as well. This may involve custom Python    |")
             print("| hooks in your manual apworld.                        |")
         print("========================================================")
+    if state.factored_locations:
+        print(f"\nThe logic for the following locations would expand to more than {args.max_dnf_clauses} clauses, "
+              f"so it was written to scripts/factored_rules.lua instead:")
+        for location_name in state.factored_locations:
+            print(f"- {location_name}")
+    if args.shared_rules:
+        print(f"\nShared rules: {state.shared_rule_count} rule lists written once and referenced by name")
+    print(f"\nRegion logic cache: {state.region_logic_table.hits} hits, {state.region_logic_table.misses} misses")
+    print(f"Rule cache: {state.rule_cache.hits} hits, {state.rule_cache.misses} misses")
+    if args.compact:
+        original_total: int = sum(sizes[0] for sizes in pack.compacted_sizes.values())
+        written_total: int = sum(sizes[1] for sizes in pack.compacted_sizes.values())
+        print(f"\nCompact output saved {original_total - written_total} bytes "
+              f"({(original_total - written_total) / max(original_total, 1):.1%}):")
+        for file_location, (original_size, written_size) in sorted(pack.compacted_sizes.items()):
+            print(f"- {file_location}: {original_size} -> {written_size} bytes, saved {original_size - written_size}")
+    if args.zip:
+        print(f"\nPack archive {'written' if pack.written_count else 'unchanged, not rewritten'}")
+    else:
+        print(f"\nFiles: {pack.written_count} written, {pack.skipped_count} unchanged and not rewritten")
     print(f"\nAll done! Your PopTracker pack is located at {args.output_path}")
+
+
+def watch_world(state: ConversionState, args: argparse.Namespace) -> None:
+    print(f"\nWatching {args.apworld_path} for changes, press Ctrl+C to stop.")
+    file_times: dict[str, float] = get_world_file_times(args.apworld_path)
+    try:
+        while True:
+            time.sleep(args.watch_interval)
+            new_file_times: dict[str, float] = get_world_file_times(args.apworld_path)
+            if new_file_times == file_times:
+                continue
+            file_times = new_file_times
+            print("\nChange detected, converting again...")
+            pack: PackWriter = create_pack_writer(args)
+            try:
+                state = convert_world(parse_world(read_world_files(args.apworld_path)), args, pack, state)
+            except (OSError, KeyError, ValueError, SyntaxError) as e:
+                # most likely a file that is still being edited; the next save will trigger another attempt
+                print(f"Could not convert the changed APWorld: {e}")
+                continue
+            print(f"Rebuilt {len(state.rebuilt_groups)} of {len(state.groups)} location groups"
+                  + (f": {', '.join(state.rebuilt_groups)}" if state.rebuilt_groups else ""))
+            print_summary(state, args, pack)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = build_argument_parser()
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error(f"--jobs must be at least 1, got {args.jobs}")
+    if not os.path.isabs(args.apworld_path):
+        args.apworld_path = os.path.abspath(args.apworld_path)
+    if not args.output_path:
+        args.output_path = get_default_output_path(args.apworld_path)
+    if args.zip and not args.output_path.endswith(".zip"):
+        args.output_path += ".zip"
+
+    if args.profile:
+        PROFILER.start()
+    if args.profile_stats:
+        profiler: cProfile.Profile = cProfile.Profile()
+        state, pack = profiler.runcall(convert_apworld, args)
+        profiler.dump_stats(args.profile_stats)
+    else:
+        state, pack = convert_apworld(args)
+    if args.profile:
+        PROFILER.stop()
+    print_summary(state, args, pack)
+    if args.profile:
+        PROFILER.print_report(args.profile_top)
+    if args.profile_stats:
+        print(f"Wrote cProfile statistics to {args.profile_stats}")
+    if args.complexity_report:
+        write_complexity_report(build_complexity_report(state), args.complexity_report)
+        print(f"Wrote the logic complexity report to {args.complexity_report}")
+    if args.watch:
+        watch_world(state, args)
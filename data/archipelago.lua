@@ -3,6 +3,30 @@ ScriptHost:LoadScript("scripts/archipelago/location_mapping.lua")
 
 CUR_INDEX = -1
 SLOT_DATA = nil
+-- Objects found by Tracker:FindObjectForCode, by code. Failed lookups are not kept, so codes whose objects do not
+-- exist yet (e.g. while the pack is still loading) are looked up again next time.
+OBJECT_CACHE = {}
+-- Items (code -> type) and location sections (code -> true) changed since the last clear. The first clear after
+-- loading resets everything, since the pack may have been loaded with saved state.
+MODIFIED_ITEMS = {}
+MODIFIED_SECTIONS = {}
+FULL_RESET_NEEDED = true
+-- Items received while replaying, as code -> {type, count}, applied together once the burst is over
+REPLAY_ACTIVE = false
+REPLAY_PENDING_ITEMS = {}
+REPLAY_RECEIVED_ITEMS = false
+REPLAY_IDLE_FRAMES = 0
+-- Frames without a new item after which a replay that has started is over
+REPLAY_END_IDLE_FRAMES = 10
+-- Frames to wait for the first item after a clear before giving up on a replay
+REPLAY_START_TIMEOUT_FRAMES = 120
+-- Location ids checked by hand and waiting to be sent, in order, plus the ids the server already knows are checked
+PENDING_LOCATION_CHECKS = {}
+PENDING_LOCATION_IDS = {}
+CHECKED_LOCATION_IDS = {}
+-- Frames to wait before sending the queued location checks again after sending them failed
+LOCATION_CHECK_RETRY_FRAMES = 60
+LOCATION_CHECK_RETRY_WAIT = 0
 
 --AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP = true
 
@@ -12,6 +36,142 @@ function onSetReply(key, value, _)
     end
 end
 
+function get_object_for_code(code)
+    local obj = OBJECT_CACHE[code]
+    if obj == nil then
+        obj = Tracker:FindObjectForCode(code)
+        OBJECT_CACHE[code] = obj
+    end
+    return obj
+end
+
+function reset_section(code)
+    if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("onClear: clearing location %s", code))
+    end
+    local obj = get_object_for_code(code)
+    if obj then
+        if code:sub(1, 1) == "@" then
+            obj.AvailableChestCount = obj.ChestCount
+        else
+            obj.Active = false
+        end
+    elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("onClear: could not find object for code %s", code))
+    end
+end
+
+function reset_item(code, item_type)
+    if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("onClear: clearing item %s of type %s", code, item_type))
+    end
+    local obj = get_object_for_code(code)
+    if obj then
+        if item_type == "toggle" then
+            obj.Active = false
+        elseif item_type == "progressive" then
+            obj.CurrentStage = 0
+            obj.Active = false
+        elseif item_type == "consumable" then
+            obj.AcquiredCount = 0
+        elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+            print(string.format("onClear: unknown item type %s for code %s", item_type, code))
+        end
+    elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("onClear: could not find object for code %s", code))
+    end
+end
+
+function set_bulk_update(enabled)
+    -- Tracker.BulkUpdate is not available in older PopTracker versions
+    pcall(function() Tracker.BulkUpdate = enabled end)
+end
+
+function apply_item(item_code, item_type, count)
+    MODIFIED_ITEMS[item_code] = item_type
+    local obj = get_object_for_code(item_code)
+    if obj then
+        if item_type == "toggle" then
+            obj.Active = true
+        elseif item_type == "progressive" then
+            if not obj.Active then
+                obj.Active = true
+                count = count - 1
+            end
+            obj.CurrentStage = obj.CurrentStage + count
+        elseif item_type == "consumable" then
+            obj.AcquiredCount = obj.AcquiredCount + (obj.Increment * count)
+        elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+            print(string.format("apply_item: unknown item type %s for code %s", item_type, item_code))
+        end
+        update_item_count(item_code)
+    elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("apply_item: could not find object for code %s", item_code))
+    end
+end
+
+function finish_replay()
+    if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print("finishing item replay")
+    end
+    REPLAY_ACTIVE = false
+    for item_code, pending in pairs(REPLAY_PENDING_ITEMS) do
+        apply_item(item_code, pending.type, pending.count)
+    end
+    REPLAY_PENDING_ITEMS = {}
+    set_bulk_update(false)
+end
+
+-- The items sent after a (re)connect arrive in a burst, which may be spread over several frames; they are collected
+-- until REPLAY_END_IDLE_FRAMES frames pass without any new ones (onItem resets the count)
+function onReplayFrame()
+    if not REPLAY_ACTIVE then
+        return
+    end
+    REPLAY_IDLE_FRAMES = REPLAY_IDLE_FRAMES + 1
+    if (REPLAY_RECEIVED_ITEMS and REPLAY_IDLE_FRAMES >= REPLAY_END_IDLE_FRAMES)
+            or REPLAY_IDLE_FRAMES > REPLAY_START_TIMEOUT_FRAMES then
+        finish_replay()
+    end
+end
+
+function flush_location_checks()
+    if #PENDING_LOCATION_CHECKS == 0 then
+        return
+    end
+    if LOCATION_CHECK_RETRY_WAIT > 0 then
+        LOCATION_CHECK_RETRY_WAIT = LOCATION_CHECK_RETRY_WAIT - 1
+        return
+    end
+    local location_ids = PENDING_LOCATION_CHECKS
+    if Archipelago:LocationChecks(location_ids) then
+        PENDING_LOCATION_CHECKS = {}
+        PENDING_LOCATION_IDS = {}
+        print(string.format("Sent %d location check(s): %s", #location_ids, table.concat(location_ids, ", ")))
+    else
+        -- the checks stay queued, as nothing else would send them again; without frame callbacks they are retried
+        -- when the next check is queued
+        if ScriptHost.AddOnFrameHandler then
+            LOCATION_CHECK_RETRY_WAIT = LOCATION_CHECK_RETRY_FRAMES
+        end
+        print(string.format("Error sending %d location check(s), will retry: %s", #location_ids,
+            table.concat(location_ids, ", ")))
+    end
+end
+
+function remove_pending_location_check(location_id)
+    if not PENDING_LOCATION_IDS[location_id] then
+        return
+    end
+    PENDING_LOCATION_IDS[location_id] = nil
+    for index, pending_id in ipairs(PENDING_LOCATION_CHECKS) do
+        if pending_id == location_id then
+            table.remove(PENDING_LOCATION_CHECKS, index)
+            break
+        end
+    end
+end
+
 function onClear(slot_data)
     if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
         print("called onClear, slot_data:\n")
@@ -25,9 +185,16 @@ function onClear(slot_data)
     end
     CUR_INDEX = -1
     SLOT_DATA = slot_data
+    -- queued checks are kept, so ones that failed to send go out over the new connection; onLocation drops those the
+    -- server already has as it reports its checked locations
+    CHECKED_LOCATION_IDS = {}
+    LOCATION_CHECK_RETRY_WAIT = 0
+    if REPLAY_ACTIVE then
+        finish_replay()
+    end
     if SLOT_DATA ~= nil then
         for key, value in pairs(SLOT_DATA) do
-            local flag_obj = Tracker:FindObjectForCode(key)
+            local flag_obj = get_object_for_code(key)
             if flag_obj ~= nil then
                 if flag_obj.Type == "toggle" then
                     flag_obj.Active = (value ~= 0)
@@ -39,47 +206,29 @@ function onClear(slot_data)
             end
         end
     end
-    -- reset locations
-    for _, v in pairs(ID_TO_LOCATION_MAP) do
-        if v[1] then
-            if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-                print(string.format("onClear: clearing location %s", v[1]))
-            end
-            local obj = Tracker:FindObjectForCode(v[1])
-            if obj then
-                if v[1]:sub(1, 1) == "@" then
-                    obj.AvailableChestCount = obj.ChestCount
-                else
-                    obj.Active = false
-                end
-            elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-                print(string.format("onClear: could not find object for code %s", v[1]))
-            end
+    -- reset locations and items
+    if FULL_RESET_NEEDED then
+        for_each_location_code(reset_section)
+        for_each_item_mapping(reset_item)
+        FULL_RESET_NEEDED = false
+    else
+        for code, _ in pairs(MODIFIED_SECTIONS) do
+            reset_section(code)
         end
-    end
-    -- reset items
-    for _, v in pairs(ITEM_MAPPING) do
-        if v[1] and v[2] then
-            if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-                print(string.format("onClear: clearing item %s of type %s", v[1], v[2]))
-            end
-            local obj = Tracker:FindObjectForCode(v[1])
-            if obj then
-                if v[2] == "toggle" then
-                    obj.Active = false
-                elseif v[2] == "progressive" then
-                    obj.CurrentStage = 0
-                    obj.Active = false
-                elseif v[2] == "consumable" then
-                    obj.AcquiredCount = 0
-                elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-                    print(string.format("onClear: unknown item type %s for code %s", v[2], v[1]))
-                end
-            elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-                print(string.format("onClear: could not find object for code %s", v[1]))
-            end
+        for code, item_type in pairs(MODIFIED_ITEMS) do
+            reset_item(code, item_type)
         end
     end
+    MODIFIED_SECTIONS = {}
+    MODIFIED_ITEMS = {}
+    invalidate_item_counts()
+    if ScriptHost.AddOnFrameHandler then
+        REPLAY_ACTIVE = true
+        REPLAY_PENDING_ITEMS = {}
+        REPLAY_RECEIVED_ITEMS = false
+        REPLAY_IDLE_FRAMES = 0
+        set_bulk_update(true)
+    end
 end
 
 -- called when an item gets collected
@@ -91,39 +240,28 @@ function onItem(index, item_id, item_name, player_number)
         return
     end
     CUR_INDEX = index;
-    local v = ITEM_MAPPING[item_id]
-    if not v then
+    local item_code, item_type = get_item_mapping(item_id)
+    if not item_code then
         if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
             print(string.format("onItem: could not find item mapping for id %s", item_id))
         end
         return
     end
     if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-        print(string.format("onItem: code: %s, type %s", v[1], v[2]))
-    end
-    if not v[1] then
-        return
+        print(string.format("onItem: code: %s, type %s", item_code, item_type))
     end
-    local item_code = v[1]
-    local item_type = v[2]
-    local obj = Tracker:FindObjectForCode(item_code)
-    if obj then
-        if item_type == "toggle" then
-            obj.Active = true
-        elseif item_type == "progressive" then
-            if obj.Active then
-                obj.CurrentStage = obj.CurrentStage + 1
-            else
-                obj.Active = true
-            end
-        elseif item_type == "consumable" then
-            obj.AcquiredCount = obj.AcquiredCount + obj.Increment
-        elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-            print(string.format("onItem: unknown item type %s for code %s", item_type, item_code))
+    if REPLAY_ACTIVE then
+        local pending = REPLAY_PENDING_ITEMS[item_code]
+        if pending then
+            pending.count = pending.count + 1
+        else
+            REPLAY_PENDING_ITEMS[item_code] = {type = item_type, count = 1}
         end
-    elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-        print(string.format("onItem: could not find object for code %s", v[1]))
+        REPLAY_RECEIVED_ITEMS = true
+        REPLAY_IDLE_FRAMES = 0
+        return
     end
+    apply_item(item_code, item_type, 1)
 end
 
 --called when a location gets cleared
@@ -131,24 +269,25 @@ function onLocation(location_id, location_name)
     if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
         print(string.format("called onLocation: %s, %s", location_id, location_name))
     end
-    local codes = ID_TO_LOCATION_MAP[location_id]
-    if not codes and AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-        print(string.format("onLocation: could not find location mapping for id %s", location_id))
-    end
-    for _, code in pairs(codes) do
-        if not code then
-            return
+    CHECKED_LOCATION_IDS[location_id] = true
+    remove_pending_location_check(location_id)
+    local code = get_location_code(location_id)
+    if not code then
+        if AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+            print(string.format("onLocation: could not find location mapping for id %s", location_id))
         end
-        local obj = Tracker:FindObjectForCode(code)
-        if obj then
-            if code:sub(1, 1) == "@" then
-                obj.AvailableChestCount = obj.AvailableChestCount - 1
-            else
-                obj.Active = true
-            end
-        elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
-            print(string.format("onLocation: could not find object for code %s", code))
+        return
+    end
+    MODIFIED_SECTIONS[code] = true
+    local obj = get_object_for_code(code)
+    if obj then
+        if code:sub(1, 1) == "@" then
+            obj.AvailableChestCount = obj.AvailableChestCount - 1
+        else
+            obj.Active = true
         end
+    elseif AUTOTRACKER_ENABLE_DEBUG_LOGGING_AP then
+        print(string.format("onLocation: could not find object for code %s", code))
     end
 end
 
@@ -169,14 +308,18 @@ end
 
 function onLocationSectionChanged(section)
     local sectionID = section.FullID
+    MODIFIED_SECTIONS["@" .. sectionID] = true
 	if (section.AvailableChestCount == 0) then
         local apID = LOCATION_TO_ID_MAP[sectionID]
         if apID ~= nil then
-            local res = Archipelago:LocationChecks({apID})
-            if res then
-                print("Sent " .. tostring(apID) .. " for " .. tostring(sectionID))
-            else
-                print("Error sending " .. tostring(apID) .. " for " .. tostring(sectionID))
+            if CHECKED_LOCATION_IDS[apID] or PENDING_LOCATION_IDS[apID] then
+                return
+            end
+            table.insert(PENDING_LOCATION_CHECKS, apID)
+            PENDING_LOCATION_IDS[apID] = true
+            -- without frame callbacks there is nothing to flush the queue later, so send right away
+            if not ScriptHost.AddOnFrameHandler then
+                flush_location_checks()
             end
         else
             print(tostring(sectionID) .. " is not an AP location")
@@ -184,7 +327,24 @@ function onLocationSectionChanged(section)
     end
 end
 
+-- catches items toggled by hand, so the next clear resets them too
+function onMappedItemChanged(code)
+    MODIFIED_ITEMS[code] = ITEM_TYPES_BY_CODE[code]
+end
+
+ITEM_TYPES_BY_CODE = {}
+for_each_item_mapping(function(code, item_type)
+    ITEM_TYPES_BY_CODE[code] = item_type
+end)
+for code, _ in pairs(ITEM_TYPES_BY_CODE) do
+    ScriptHost:AddWatchForCode("modified item: " .. code, code, onMappedItemChanged)
+end
+
 ScriptHost:AddOnLocationSectionChangedHandler("manual", onLocationSectionChanged)
+if ScriptHost.AddOnFrameHandler then
+    ScriptHost:AddOnFrameHandler("item replay", onReplayFrame)
+    ScriptHost:AddOnFrameHandler("location checks", flush_location_checks)
+end
 
 -- add AP callbacks
 -- un-/comment as needed
@@ -3,37 +3,99 @@ function negate(code)
 	return Tracker:ProviderCountForCode(code) == 0
 end
 
+-- Running totals for has_count_from_group and ItemValue. They are updated from item watches and the AP handlers, and
+-- recounted from scratch whenever they are marked invalid (on load and on every AP clear).
+ITEM_COUNTS = {}
+GROUP_COUNTS = {}
+VALUE_TOTALS = {}
+ITEM_COUNTS_VALID = false
+-- code -> {groups = {group names}, values = {value category -> value}}
+ITEM_COUNT_INDEX = {}
+
+for group_name, group_members in pairs(ITEM_GROUPS) do
+    for _, item in pairs(group_members) do
+        ITEM_COUNT_INDEX[item] = ITEM_COUNT_INDEX[item] or {groups = {}, values = {}}
+        table.insert(ITEM_COUNT_INDEX[item].groups, group_name)
+    end
+end
+for value_category_name, category_values in pairs(ITEM_VALUES) do
+    for item, item_value in pairs(category_values) do
+        ITEM_COUNT_INDEX[item] = ITEM_COUNT_INDEX[item] or {groups = {}, values = {}}
+        ITEM_COUNT_INDEX[item].values[value_category_name] = item_value
+    end
+end
+
+function invalidate_item_counts()
+    ITEM_COUNTS_VALID = false
+end
+
+function recount_items()
+    ITEM_COUNTS = {}
+    GROUP_COUNTS = {}
+    VALUE_TOTALS = {}
+    for group_name, _ in pairs(ITEM_GROUPS) do
+        GROUP_COUNTS[group_name] = 0
+    end
+    for value_category_name, _ in pairs(ITEM_VALUES) do
+        VALUE_TOTALS[value_category_name] = 0
+    end
+    for item, memberships in pairs(ITEM_COUNT_INDEX) do
+        local item_count = Tracker:ProviderCountForCode(item)
+        ITEM_COUNTS[item] = item_count
+        for _, group_name in pairs(memberships.groups) do
+            GROUP_COUNTS[group_name] = GROUP_COUNTS[group_name] + item_count
+        end
+        for value_category_name, item_value in pairs(memberships.values) do
+            VALUE_TOTALS[value_category_name] = VALUE_TOTALS[value_category_name] + (item_count * item_value)
+        end
+    end
+    ITEM_COUNTS_VALID = true
+end
+
+-- Applies the change in a single item's count to the running totals
+function update_item_count(code)
+    local memberships = ITEM_COUNT_INDEX[code]
+    if not ITEM_COUNTS_VALID or memberships == nil then
+        return
+    end
+    local item_count = Tracker:ProviderCountForCode(code)
+    local delta = item_count - (ITEM_COUNTS[code] or 0)
+    if delta == 0 then
+        return
+    end
+    ITEM_COUNTS[code] = item_count
+    for _, group_name in pairs(memberships.groups) do
+        GROUP_COUNTS[group_name] = GROUP_COUNTS[group_name] + delta
+    end
+    for value_category_name, item_value in pairs(memberships.values) do
+        VALUE_TOTALS[value_category_name] = VALUE_TOTALS[value_category_name] + (delta * item_value)
+    end
+end
+
+for item, _ in pairs(ITEM_COUNT_INDEX) do
+    ScriptHost:AddWatchForCode("item count: " .. item, item, update_item_count)
+end
+
 -- Returns true if there are at least count number of items from group group_name
 function has_count_from_group(group_name, count)
-    local group_members = ITEM_GROUPS[group_name]
-    if group_members == nil then
+    if ITEM_GROUPS[group_name] == nil then
         return false
     end
-    local found_count = 0
-    for _, item in pairs(group_members) do
-        found_count = found_count + Tracker:ProviderCountForCode(item)
-        if found_count >= tonumber(count) then
-            return true
-        end
+    if not ITEM_COUNTS_VALID then
+        recount_items()
     end
-    return false
+    return GROUP_COUNTS[group_name] >= tonumber(count)
 end
 
 -- Below are logic functions that come bundled with Manual.
 function ItemValue(value_category_name, target_value)
-    category_values = ITEM_VALUES[value_category_name]
-    if category_values == nil then
+    if ITEM_VALUES[value_category_name] == nil then
         return false
     end
-    local current_value = 0
-    for item_name, item_value in pairs(category_values) do
-        local item_count = Tracker:ProviderCountForCode(item_name)
-        current_value = current_value + (item_count * item_value)
-        if current_value >= target_value then
-            return true
-        end
+    if not ITEM_COUNTS_VALID then
+        recount_items()
     end
-    return false
+    return VALUE_TOTALS[value_category_name] >= tonumber(target_value)
 end
 
 
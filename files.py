@@ -1,229 +1,610 @@
+import csv
+import filecmp
+import io
 import os
 import shutil
+import zipfile
 
 import json
+from typing import Callable, Iterator, TextIO
+from profiling import *
 from utils import *
 
+# Number of encoded pieces json.JSONEncoder.iterencode yields that are gathered into each write to the output file
+JSON_WRITE_CHUNK_COUNT = 4096
 
-def write_json_file(json_object: any, pack_root: str, file_location: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, file_location)
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        json_dump = json.dumps(json_object, indent=4)
-        file.write(json_dump)
-
-
-def write_lua_init_file(location_file_paths: list[str], has_custom_lua: bool, pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, "scripts/init.lua")
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    file_contents: str = (
-        "Tracker:AddItems(\"items/items.json\")\n"
-        "Tracker:AddItems(\"items/options.json\")\n"
-        "Tracker:AddMaps(\"maps/maps.json\")\n"
-        "ScriptHost:LoadScript(\"scripts/item_data.lua\")\n"
-        "ScriptHost:LoadScript(\"scripts/util.lua\")\n"
-        "ScriptHost:LoadScript(\"scripts/archipelago/archipelago.lua\")\n"
-        "Tracker:AddLayouts(\"layouts/options_layout.json\")\n"
-        "Tracker:AddLayouts(\"layouts/input_layout.json\")\n"
-        "Tracker:AddLayouts(\"layouts/map_layouts.json\")\n"
-        "Tracker:AddLayouts(\"layouts/main.json\")\n"
-    )
-    file_contents += "ScriptHost:LoadScript(\"scripts/custom_util.lua\")\n" if has_custom_lua else ""
-    for location_file_path in location_file_paths:
-        file_contents += f"Tracker:AddLocations(\"{location_file_path}\")\n"
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        file.write(file_contents)
-
-
-def write_custom_util_lua_file(functions: dict[str, int], pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, "scripts/custom_util.lua")
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    file_content: str = "-- Implement custom logic functions here\n\n"
-    for function_name, param_count in sorted(functions.items()):
-        file_content += f"-- Custom logic: {function_name}\n"
-        file_content += f"function {function_name}("
-        first_param: bool = True
-        for i in range(param_count):
-            if first_param:
-                first_param = False
-            else:
-                file_content += ", "
-            file_content += f"param{i+1}"
-        file_content += ")\n"
-        file_content += "\t-- Implement your logic here. Parameters are strings and numbered from left to right.\n"
-        file_content += "\treturn true\n"
-        file_content += "end\n\n"
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        file.write(file_content)
+# The timestamp given to every file in a zipped pack, so that the same input always gives the same archive
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+# The largest gap between two ids that still goes in the array part of a dense mapping table; ids past a larger gap are
+# kept in a hash table instead
+MAX_DENSE_ID_GAP = 64
+
+# The columns of the logic complexity report, for both its location and region rows
+COMPLEXITY_REPORT_COLUMNS = ["kind", "name", "group", "region", "rule_length", "parse_depth", "region_paths",
+                             "dnf_clauses", "reduced_dnf_clauses", "factored", "access_rules_size"]
+
+# The bundled files copied into every pack, found next to this module so the converter works from any directory
+DEFAULT_FILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+ITEM_MAPPING_ACCESSORS = """
+function get_item_mapping(item_id)
+    local v = ITEM_MAPPING[item_id]
+    if v then
+        return v[1], v[2]
+    end
+end
+
+function for_each_item_mapping(callback)
+    for _, v in pairs(ITEM_MAPPING) do
+        callback(v[1], v[2])
+    end
+end
+"""
+
+DENSE_ITEM_MAPPING_ACCESSORS = """
+function get_item_mapping(item_id)
+    local code = ITEM_CODES[item_id - ITEM_ID_OFFSET]
+    if code then
+        return code, ITEM_TYPES[item_id - ITEM_ID_OFFSET]
+    end
+    local v = ITEM_MAPPING[item_id]
+    if v then
+        return v[1], v[2]
+    end
+end
+
+function for_each_item_mapping(callback)
+    for index, code in ipairs(ITEM_CODES) do
+        if code then
+            callback(code, ITEM_TYPES[index])
+        end
+    end
+    for _, v in pairs(ITEM_MAPPING) do
+        callback(v[1], v[2])
+    end
+end
+"""
+
+LOCATION_MAPPING_ACCESSORS = """
+function get_location_code(location_id)
+    local v = ID_TO_LOCATION_MAP[location_id]
+    if v then
+        return v[1]
+    end
+end
+
+function for_each_location_code(callback)
+    for _, v in pairs(ID_TO_LOCATION_MAP) do
+        callback(v[1])
+    end
+end
+"""
+
+DENSE_LOCATION_MAPPING_ACCESSORS = """
+function get_location_code(location_id)
+    return LOCATION_CODES[location_id - LOCATION_ID_OFFSET] or ID_TO_LOCATION_MAP[location_id]
+end
+
+function for_each_location_code(callback)
+    for _, code in ipairs(LOCATION_CODES) do
+        if code then
+            callback(code)
+        end
+    end
+    for _, code in pairs(ID_TO_LOCATION_MAP) do
+        callback(code)
+    end
+end
+"""
+
+
+class LuaTrimmingWriter:
+    def __init__(self, file: TextIO, on_close: Callable[[int, int], None]) -> None:
+        self.file: TextIO = file
+        self.on_close: Callable[[int, int], None] = on_close
+        self.partial_line: str = ""
+        self.original_size: int = 0
+        self.written_size: int = 0
+
+    def __enter__(self) -> "LuaTrimmingWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        # on an error the wrapped file decides what to keep, without the trimmed remainder being written to it
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.__exit__(exc_type, *exc_info)
+
+    def write_line(self, line: str, newline: str) -> None:
+        self.original_size += len(line.encode("utf_8")) + len(newline)
+        trimmed_line: str = line.strip()
+        # the generated scripts have no multi-line strings or comments, so whole lines can be dropped and re-indented
+        if not trimmed_line or trimmed_line.startswith("--"):
+            return
+        self.written_size += len(trimmed_line.encode("utf_8")) + len(newline)
+        self.file.write(trimmed_line + newline)
+
+    def write(self, text: str) -> None:
+        lines: list[str] = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.write_line(line, "\n")
+
+    def close(self) -> None:
+        self.write_line(self.partial_line, "")
+        self.partial_line = ""
+        self.file.close()
+        self.on_close(self.original_size, self.written_size)
+
+
+class ClosingTextFile(io.TextIOWrapper):
+    def __init__(self, filepath: str, on_close: Callable[[], None], on_discard: Callable[[], None]) -> None:
+        super().__init__(open(filepath, 'wb'), encoding="utf_8")
+        self.on_close: Callable[[], None] = on_close
+        self.on_discard: Callable[[], None] = on_discard
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # a file cut short by an error is thrown away, so the pack keeps the file from the last complete run
+        if not self.closed:
+            super().close()
+            self.on_discard()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        self.on_close()
+
+
+class MemoryTextFile(io.TextIOWrapper):
+    def __init__(self, on_close: Callable[[bytes], None]) -> None:
+        super().__init__(io.BytesIO(), encoding="utf_8")
+        self.on_close: Callable[[bytes], None] = on_close
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        self.on_close(self.buffer.getvalue())
+        super().close()
+
+
+class PackWriter:
+    def __init__(self, pack_root: str, compact: bool = False) -> None:
+        if not os.path.isabs(pack_root):
+            raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
+        self.pack_root: str = pack_root
+        self.compact: bool = compact
+        # file location -> (size as normally written, size as written in compact mode), for compacted files only
+        self.compacted_sizes: dict[str, tuple[int, int]] = {}
+        self.written_count: int = 0
+        self.skipped_count: int = 0
+
+    def replace_if_changed(self, temp_filepath: str, full_filepath: str) -> None:
+        # leaving identical files untouched keeps their modification times, so PopTracker only reloads what changed
+        if os.path.exists(full_filepath) and filecmp.cmp(temp_filepath, full_filepath, shallow=False):
+            os.remove(temp_filepath)
+            self.skipped_count += 1
+        else:
+            os.replace(temp_filepath, full_filepath)
+            self.written_count += 1
+
+    def open(self, file_location: str) -> TextIO:
+        full_filepath: str = os.path.join(self.pack_root, file_location)
+        if not os.path.exists(os.path.dirname(full_filepath)):
+            os.makedirs(os.path.dirname(full_filepath))
+        temp_filepath: str = f"{full_filepath}.tmp"
+        return ClosingTextFile(temp_filepath, lambda: self.replace_if_changed(temp_filepath, full_filepath),
+                               lambda: os.remove(temp_filepath))
+
+    def open_lua(self, file_location: str) -> TextIO:
+        if not self.compact:
+            return self.open(file_location)
+
+        def record_sizes(original_size: int, written_size: int) -> None:
+            self.compacted_sizes[file_location] = (original_size, written_size)
+        return LuaTrimmingWriter(self.open(file_location), record_sizes)
+
+    def copy_file(self, source_filepath: str, file_location: str, keep_existing: bool = False) -> None:
+        full_filepath: str = os.path.join(self.pack_root, file_location)
+        if os.path.exists(full_filepath) and (keep_existing or filecmp.cmp(source_filepath, full_filepath,
+                                                                           shallow=False)):
+            self.skipped_count += 1
+            return
+        if not os.path.exists(os.path.dirname(full_filepath)):
+            os.makedirs(os.path.dirname(full_filepath))
+        shutil.copyfile(source_filepath, full_filepath)
+        self.written_count += 1
+
+    def close(self) -> None:
+        pass
+
+
+def get_pack_zip_info(file_location: str, compress_type: int) -> zipfile.ZipInfo:
+    zip_info: zipfile.ZipInfo = zipfile.ZipInfo(file_location, date_time=ZIP_TIMESTAMP)
+    zip_info.compress_type = compress_type
+    zip_info.create_system = 3
+    zip_info.external_attr = 0o644 << 16
+    return zip_info
+
+
+def get_compress_type(file_location: str) -> int:
+    # images are already compressed, so they are stored as is rather than compressed again for every copy
+    return zipfile.ZIP_STORED if file_location.endswith(".png") else zipfile.ZIP_DEFLATED
+
+
+class ZipPackWriter(PackWriter):
+    def __init__(self, zip_path: str, compact: bool = False) -> None:
+        super().__init__(zip_path, compact)
+        if not os.path.exists(os.path.dirname(zip_path)):
+            os.makedirs(os.path.dirname(zip_path))
+        self.archive: zipfile.ZipFile = zipfile.ZipFile(f"{zip_path}.tmp", 'w')
+        # the archive from the last run, whose images may have been replaced by hand since
+        self.previous_archive: zipfile.ZipFile | None = zipfile.ZipFile(zip_path) if zipfile.is_zipfile(zip_path) \
+            else None
+        self.written_locations: set[str] = set()
+        # source files like the placeholder images are read once, however many times they are copied into the pack
+        self.source_files: dict[str, bytes] = {}
+
+    def get_zip_info(self, file_location: str, compress_type: int) -> zipfile.ZipInfo:
+        self.written_locations.add(file_location)
+        return get_pack_zip_info(file_location, compress_type)
+
+    def open(self, file_location: str) -> TextIO:
+        zip_info: zipfile.ZipInfo = self.get_zip_info(file_location, zipfile.ZIP_DEFLATED)
+        return io.TextIOWrapper(self.archive.open(zip_info, 'w'), encoding="utf_8", newline="\n")
 
+    def copy_file(self, source_filepath: str, file_location: str, keep_existing: bool = False) -> None:
+        if keep_existing and file_location in self.written_locations:
+            return
+        if keep_existing and self.previous_archive is not None and \
+                file_location in self.previous_archive.NameToInfo:
+            self.archive.writestr(self.get_zip_info(file_location, get_compress_type(file_location)),
+                                  self.previous_archive.read(file_location))
+            return
+        if source_filepath not in self.source_files:
+            with open(source_filepath, 'rb') as source_file:
+                self.source_files[source_filepath] = source_file.read()
+        self.archive.writestr(self.get_zip_info(file_location, get_compress_type(file_location)),
+                              self.source_files[source_filepath])
 
+    def close(self) -> None:
+        self.archive.close()
+        if self.previous_archive is not None:
+            self.previous_archive.close()
+        self.replace_if_changed(f"{self.pack_root}.tmp", self.pack_root)
+
+
+class MemoryPackWriter(PackWriter):
+    def __init__(self, compact: bool = False) -> None:
+        super().__init__(os.path.abspath(os.sep), compact)
+        # file location -> contents, in the order the files were written
+        self.files: dict[str, bytes] = {}
+        self.source_files: dict[str, bytes] = {}
+
+    def store(self, file_location: str, contents: bytes) -> None:
+        self.files[file_location] = contents
+        self.written_count += 1
+
+    def open(self, file_location: str) -> TextIO:
+        return MemoryTextFile(lambda contents: self.store(file_location, contents))
+
+    def copy_file(self, source_filepath: str, file_location: str, keep_existing: bool = False) -> None:
+        if keep_existing and file_location in self.files:
+            self.skipped_count += 1
+            return
+        if source_filepath not in self.source_files:
+            with open(source_filepath, 'rb') as source_file:
+                self.source_files[source_filepath] = source_file.read()
+        self.store(file_location, self.source_files[source_filepath])
+
+
+def build_pack_archive(files: dict[str, bytes]) -> bytes:
+    archive_buffer: io.BytesIO = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, 'w') as archive:
+        for file_location, contents in files.items():
+            archive.writestr(get_pack_zip_info(file_location, get_compress_type(file_location)), contents)
+    return archive_buffer.getvalue()
+
+
+def get_json_indent_size(json_object: any, depth: int = 0) -> int:
+    # the characters json.dumps(indent=4) adds over json.dumps(separators=(",", ":")): a newline and indent before each
+    # element and before the closing bracket of a non-empty container, and a space after each key's colon
+    if isinstance(json_object, dict):
+        if not json_object:
+            return 0
+        size: int = len(json_object) * (2 + 4 * (depth + 1)) + 1 + 4 * depth
+        for value in json_object.values():
+            size += get_json_indent_size(value, depth + 1)
+        return size
+    if isinstance(json_object, (list, tuple)):
+        if not json_object:
+            return 0
+        size: int = len(json_object) * (1 + 4 * (depth + 1)) + 1 + 4 * depth
+        for value in json_object:
+            size += get_json_indent_size(value, depth + 1)
+        return size
+    return 0
+
+
+def write_json(json_object: any, file: TextIO, compact: bool = False) -> int:
+    encoder: json.JSONEncoder = json.JSONEncoder(separators=(",", ":")) if compact else json.JSONEncoder(indent=4)
+    written_size: int = 0
+    chunks: list[str] = []
+    for chunk in encoder.iterencode(json_object):
+        chunks.append(chunk)
+        if len(chunks) >= JSON_WRITE_CHUNK_COUNT:
+            written_chunk: str = "".join(chunks)
+            file.write(written_chunk)
+            written_size += len(written_chunk)
+            chunks = []
+    written_chunk: str = "".join(chunks)
+    file.write(written_chunk)
+    return written_size + len(written_chunk)
+
+
+@profiled
+def write_json_file(json_object: any, pack: PackWriter, file_location: str) -> None:
+    with pack.open(file_location) as file:
+        written_size: int = write_json(json_object, file, pack.compact)
+    if pack.compact:
+        pack.compacted_sizes[file_location] = (written_size + get_json_indent_size(json_object), written_size)
+
+
+@profiled
+def write_lua_init_file(location_file_paths: list[str],
+                        has_custom_lua: bool,
+                        has_factored_rules: bool,
+                        has_compiled_rules: bool,
+                        pack: PackWriter) -> None:
+    with pack.open_lua("scripts/init.lua") as file:
+        file.write(
+            "Tracker:AddItems(\"items/items.json\")\n"
+            "Tracker:AddItems(\"items/options.json\")\n"
+            "Tracker:AddMaps(\"maps/maps.json\")\n"
+            "ScriptHost:LoadScript(\"scripts/item_data.lua\")\n"
+            "ScriptHost:LoadScript(\"scripts/util.lua\")\n"
+            "ScriptHost:LoadScript(\"scripts/archipelago/archipelago.lua\")\n"
+            "Tracker:AddLayouts(\"layouts/options_layout.json\")\n"
+            "Tracker:AddLayouts(\"layouts/input_layout.json\")\n"
+            "Tracker:AddLayouts(\"layouts/map_layouts.json\")\n"
+            "Tracker:AddLayouts(\"layouts/main.json\")\n"
+        )
+        if has_custom_lua:
+            file.write("ScriptHost:LoadScript(\"scripts/custom_util.lua\")\n")
+        if has_factored_rules:
+            file.write("ScriptHost:LoadScript(\"scripts/factored_rules.lua\")\n")
+        if has_compiled_rules:
+            file.write("ScriptHost:LoadScript(\"scripts/compiled_rules.lua\")\n")
+        for location_file_path in location_file_paths:
+            file.write(f"Tracker:AddLocations(\"{location_file_path}\")\n")
+
+
+@profiled
+def write_custom_util_lua_file(functions: dict[str, int], pack: PackWriter) -> None:
+    with pack.open("scripts/custom_util.lua") as file:
+        file.write("-- Implement custom logic functions here\n\n")
+        for function_name, param_count in sorted(functions.items()):
+            file.write(f"-- Custom logic: {function_name}\n")
+            file.write(f"function {function_name}(")
+            file.write(", ".join(f"param{i+1}" for i in range(param_count)))
+            file.write(")\n")
+            file.write("\t-- Implement your logic here. Parameters are strings and numbered from left to right.\n")
+            file.write("\treturn true\n")
+            file.write("end\n\n")
+
+
+@profiled
+def write_factored_rules_lua_file(factored_rules: dict[str, str], pack: PackWriter) -> None:
+    with pack.open_lua("scripts/factored_rules.lua") as file:
+        file.write("-- Generated logic for rules too large to expand into access_rules lists\n\n")
+        for function_name, lua_expression in sorted(factored_rules.items()):
+            file.write(f"function {function_name}()\n")
+            file.write(f"\treturn {lua_expression}\n")
+            file.write("end\n\n")
+
+
+@profiled
+def write_compiled_rules_lua_file(compiled_rules: dict[str, str], pack: PackWriter) -> None:
+    with pack.open_lua("scripts/compiled_rules.lua") as file:
+        file.write("-- Generated access rules, compiled from the access_rules lists in the location files\n\n")
+        for function_name, function_body in sorted(compiled_rules.items()):
+            file.write(f"function {function_name}()\n")
+            file.write(function_body)
+            file.write("end\n\n")
+
+
+def get_dense_id_run(ids: list[int]) -> tuple[int, int]:
+    if not ids:
+        return 1, 0
+    sorted_ids: list[int] = sorted(ids)
+    best_run: tuple[int, int] = (0, -1)
+    run_start: int = 0
+    for index in range(1, len(sorted_ids) + 1):
+        if index == len(sorted_ids) or sorted_ids[index] - sorted_ids[index - 1] > MAX_DENSE_ID_GAP:
+            if index - run_start > best_run[1] - best_run[0] + 1:
+                best_run = (run_start, index - 1)
+            run_start = index
+    return sorted_ids[best_run[0]], sorted_ids[best_run[1]]
+
+
+def get_mapped_ids(entries: list[dict[str, any]], starting_index: int) -> Iterator[tuple[int, dict[str, any]]]:
+    calculated_id: int = starting_index
+    for entry in entries:
+        if "id" in entry and entry["id"] > calculated_id:
+            calculated_id = entry["id"]
+        yield calculated_id, entry
+        calculated_id += 1
+
+
+def is_mapped_item(item: dict[str, any]) -> bool:
+    return (("progression" in item and item["progression"]) or
+            ("progression_skip_balancing" in item and item["progression_skip_balancing"]))
+
+
+def get_mapped_item_type(item: dict[str, any]) -> str:
+    return "consumable" if "count" in item and int(item["count"]) > 1 else "toggle"
+
+
+def get_section_identifier(location: dict[str, any]) -> str:
+    return f"{location['category'][0].replace('/', '-')}/" \
+           f"{location['region'].replace('/', '-')}/" \
+           f"{location['name'].replace('/', '-')}"
+
+
+@profiled
 def write_item_mapping_script(items: list[dict[str, any]],
                               starting_index: int,
-                              pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, "scripts/archipelago/item_mapping.lua")
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    file_content: str = "ITEM_MAPPING = {\n"
-    calculated_item_id: int = starting_index
-    for item in items:
-        if "id" in item and item["id"] > calculated_item_id:
-            calculated_item_id = item["id"]
-        if (("progression" in item and item["progression"]) or
-           ("progression_skip_balancing" in item and item["progression_skip_balancing"])):
-            item_type: str = "consumable" if "count" in item and int(item["count"]) > 1 else "toggle"
-            file_content += f"    [{calculated_item_id}] = {{\"{to_snake_case(item['name'])}\", \"{item_type}\"}},\n"
-        calculated_item_id += 1
-    file_content += "}"
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        file.write(file_content)
+                              pack: PackWriter,
+                              dense: bool = False) -> None:
+    with pack.open_lua("scripts/archipelago/item_mapping.lua") as file:
+        if dense:
+            # ids only ever increase, so the array entries can be written in a single pass
+            first_id, last_id = get_dense_id_run([item_id for item_id, item in get_mapped_ids(items, starting_index)
+                                                  if is_mapped_item(item)])
+            file.write(f"ITEM_ID_OFFSET = {first_id - 1}\n")
+            for table_name, get_value in [("ITEM_CODES", lambda item: to_snake_case(item['name'])),
+                                          ("ITEM_TYPES", get_mapped_item_type)]:
+                file.write(f"{table_name} = {{\n")
+                next_id: int = first_id
+                for item_id, item in get_mapped_ids(items, starting_index):
+                    if item_id < first_id or item_id > last_id or not is_mapped_item(item):
+                        continue
+                    file.write("    false,\n" * (item_id - next_id))
+                    file.write(f"    \"{get_value(item)}\",\n")
+                    next_id = item_id + 1
+                file.write("}\n")
+            file.write("ITEM_MAPPING = {\n")
+            for item_id, item in get_mapped_ids(items, starting_index):
+                if (item_id < first_id or item_id > last_id) and is_mapped_item(item):
+                    file.write(f"    [{item_id}] = {{\"{to_snake_case(item['name'])}\", "
+                               f"\"{get_mapped_item_type(item)}\"}},\n")
+            file.write("}\n")
+            file.write(DENSE_ITEM_MAPPING_ACCESSORS)
+        else:
+            file.write("ITEM_MAPPING = {\n")
+            for item_id, item in get_mapped_ids(items, starting_index):
+                if is_mapped_item(item):
+                    file.write(f"    [{item_id}] = {{\"{to_snake_case(item['name'])}\", "
+                               f"\"{get_mapped_item_type(item)}\"}},\n")
+            file.write("}\n")
+            file.write(ITEM_MAPPING_ACCESSORS)
 
 
+@profiled
 def write_location_mapping_script(locations: list[dict[str, any]],
                                   starting_index: int,
-                                  pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, "scripts/archipelago/location_mapping.lua")
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    location_to_id_string: str = "LOCATION_TO_ID_MAP = {\n"
-    id_to_location_string: str = "ID_TO_LOCATION_MAP = {\n"
-    calculated_location_id: int = starting_index
-    for location in locations:
-        if "id" in location and location["id"] > calculated_location_id:
-            calculated_location_id = location["id"]
-        section_identifier: str = f"{location['category'][0].replace('/', '-')}/" \
-                                  f"{location['region'].replace('/', '-')}/" \
-                                  f"{location['name'].replace('/', '-')}"
-        id_to_location_string += f"    [{calculated_location_id}] = {{\"@{section_identifier}\"}},\n"
-        location_to_id_string += f"    [\"{section_identifier}\"] = {calculated_location_id},\n"
-        calculated_location_id += 1
-    location_to_id_string += "}\n"
-    id_to_location_string += "}\n"
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        file.write(location_to_id_string + id_to_location_string)
-
-
-def copy_default_files(items: list[dict[str, any]], options: list[dict[str, any]], map_names: set[str], pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    item_images_dirpath: str = os.path.join(pack_root, "images/items/")
-    if not os.path.exists(item_images_dirpath):
-        os.makedirs(item_images_dirpath)
+                                  pack: PackWriter,
+                                  dense: bool = False) -> None:
+    with pack.open_lua("scripts/archipelago/location_mapping.lua") as file:
+        file.write("LOCATION_TO_ID_MAP = {\n")
+        for location_id, location in get_mapped_ids(locations, starting_index):
+            file.write(f"    [\"{get_section_identifier(location)}\"] = {location_id},\n")
+        file.write("}\n")
+        if dense:
+            first_id, last_id = get_dense_id_run([location_id for location_id, _ in
+                                                  get_mapped_ids(locations, starting_index)])
+            file.write(f"LOCATION_ID_OFFSET = {first_id - 1}\nLOCATION_CODES = {{\n")
+            next_id: int = first_id
+            for location_id, location in get_mapped_ids(locations, starting_index):
+                if location_id < first_id or location_id > last_id:
+                    continue
+                file.write("    false,\n" * (location_id - next_id))
+                file.write(f"    \"@{get_section_identifier(location)}\",\n")
+                next_id = location_id + 1
+            file.write("}\nID_TO_LOCATION_MAP = {\n")
+            for location_id, location in get_mapped_ids(locations, starting_index):
+                if location_id < first_id or location_id > last_id:
+                    file.write(f"    [{location_id}] = \"@{get_section_identifier(location)}\",\n")
+            file.write("}\n")
+            file.write(DENSE_LOCATION_MAPPING_ACCESSORS)
+        else:
+            file.write("ID_TO_LOCATION_MAP = {\n")
+            for location_id, location in get_mapped_ids(locations, starting_index):
+                file.write(f"    [{location_id}] = {{\"@{get_section_identifier(location)}\"}},\n")
+            file.write("}\n")
+            file.write(LOCATION_MAPPING_ACCESSORS)
+
+
+@profiled
+def copy_default_files(items: list[dict[str, any]], options: list[dict[str, any]], map_names: set[str], pack: PackWriter) -> None:
+    default_image_filepath: str = os.path.join(DEFAULT_FILES_PATH, "default_item_option_image.png")
     for item in items:
         if (("progression" not in item or not item["progression"]) and
            ("progression_skip_balancing" not in item or not item["progression_skip_balancing"])):
             continue
-        image_filename = f"{to_snake_case(item['name'])}.png"
-        item_image_filepath = os.path.join(item_images_dirpath, image_filename)
-        if not os.path.exists(item_image_filepath):
-            shutil.copyfile("./data/default_item_option_image.png", item_image_filepath)
-    option_images_dirpath: str = os.path.join(pack_root, "images/options/")
-    if not os.path.exists(option_images_dirpath):
-        os.makedirs(option_images_dirpath)
+        pack.copy_file(default_image_filepath, f"images/items/{to_snake_case(item['name'])}.png", keep_existing=True)
     for option in options:
         if option["type"] == "progressive":
             for option_stage in option["stages"]:
-                image_filename = f"{option_stage['codes']}.png"
-                option_image_filepath = os.path.join(option_images_dirpath, image_filename)
-                if not os.path.exists(option_image_filepath):
-                    shutil.copyfile("./data/default_item_option_image.png", option_image_filepath)
+                pack.copy_file(default_image_filepath, f"images/options/{option_stage['codes']}.png",
+                               keep_existing=True)
         else:
-            image_filename = f"{option['name']}.png"
-            option_image_filepath = os.path.join(option_images_dirpath, image_filename)
-            if not os.path.exists(option_image_filepath):
-                shutil.copyfile("./data/default_item_option_image.png", option_image_filepath)
-    ap_lua_filepath = os.path.join(pack_root, "scripts/archipelago/archipelago.lua")
-    if not os.path.exists(os.path.dirname(ap_lua_filepath)):
-        os.makedirs(os.path.dirname(ap_lua_filepath))
-    shutil.copyfile("./data/archipelago.lua", ap_lua_filepath)
-    util_lua_filepath = os.path.join(pack_root, "scripts/util.lua")
-    if not os.path.exists(os.path.dirname(util_lua_filepath)):
-        os.makedirs(os.path.dirname(util_lua_filepath))
-    shutil.copyfile("./data/util.lua", util_lua_filepath)
-    main_layout_json_filepath = os.path.join(pack_root, "layouts/main.json")
-    if not os.path.exists(os.path.dirname(main_layout_json_filepath)):
-        os.makedirs(os.path.dirname(main_layout_json_filepath))
-    shutil.copyfile("./data/main.json", main_layout_json_filepath)
+            pack.copy_file(default_image_filepath, f"images/options/{option['name']}.png", keep_existing=True)
+    pack.copy_file(os.path.join(DEFAULT_FILES_PATH, "archipelago.lua"), "scripts/archipelago/archipelago.lua")
+    pack.copy_file(os.path.join(DEFAULT_FILES_PATH, "util.lua"), "scripts/util.lua")
+    pack.copy_file(os.path.join(DEFAULT_FILES_PATH, "main.json"), "layouts/main.json")
     for map_name in sorted(list(map_names)):
-        placeholder_map_image_filepath = os.path.join(pack_root, f"images/maps/{map_name}.png")
-        if not os.path.exists(os.path.dirname(placeholder_map_image_filepath)):
-            os.makedirs(os.path.dirname(placeholder_map_image_filepath))
-        if not os.path.exists(placeholder_map_image_filepath):
-            shutil.copyfile("./data/placeholder_map.png", placeholder_map_image_filepath)
+        pack.copy_file(os.path.join(DEFAULT_FILES_PATH, "placeholder_map.png"), f"images/maps/{map_name}.png",
+                       keep_existing=True)
 
 
+@profiled
 def write_data_lua_script(item_groups: dict[str, list[str]],
                           item_values: dict[str, dict[str, int]],
                           options: dict[str, any],
-                          pack_root: str) -> None:
-    if not os.path.isabs(pack_root):
-        raise SyntaxError(f"Pack root must be an absolute path! Given pack root: {pack_root}")
-    full_filepath: str = os.path.join(pack_root, "scripts/item_data.lua")
-    if not os.path.exists(os.path.dirname(full_filepath)):
-        os.makedirs(os.path.dirname(full_filepath))
-    file_contents: str = "ITEM_GROUPS = {\n"
-    first_group: bool = True
-    for group, items in item_groups.items():
-        if first_group:
-            first_group = False
-        else:
-            file_contents += ",\n"
-        file_contents += f"\t[\"{group}\"] = {{"
-        first_item: bool = True
-        for item in items:
-            if first_item:
-                first_item = False
-            else:
-                file_contents += ", "
-            file_contents += f"\"{to_snake_case(item)}\""
-        file_contents += "}"
-    file_contents += "\n}\n\n\nITEM_VALUES = {\n"
-    first_category: bool = True
-    for value_category, values in item_values.items():
-        if first_category:
-            first_category = False
-        else:
-            file_contents += ",\n"
-        file_contents += f"\t[\"{value_category}\"] = {{"
-        first_item_value: bool = True
-        for item_name, item_value in values.items():
-            if first_item_value:
-                first_item_value = False
+                          pack: PackWriter) -> None:
+    with pack.open_lua("scripts/item_data.lua") as file:
+        file.write("ITEM_GROUPS = {\n")
+        first_group: bool = True
+        for group, items in item_groups.items():
+            if first_group:
+                first_group = False
             else:
-                file_contents += ", "
-            file_contents += f"[\"{to_snake_case(item_name)}\"] = {item_value}"
-        file_contents += "}"
-    file_contents += "\n}\n\n\nSTAGE_MAPPINGS = {\n"
-    if "user" in options:
-        first_option: bool = True
-        for option_name, option_data in options["user"].items():
-            if "type" not in option_data or option_data["type"] != "Choice":
-                continue
-            if first_option:
-                first_option = False
+                file.write(",\n")
+            file.write(f"\t[\"{group}\"] = {{")
+            file.write(", ".join(f"\"{to_snake_case(item)}\"" for item in items))
+            file.write("}")
+        file.write("\n}\n\n\nITEM_VALUES = {\n")
+        first_category: bool = True
+        for value_category, values in item_values.items():
+            if first_category:
+                first_category = False
             else:
-                file_contents += ",\n"
-            file_contents += f"\t[\"{format_to_valid_identifier(option_name)}\"] = {{"
-            value_index: int = 0
-            for value in option_data["values"].values():
-                if value_index:
-                    file_contents += ", "
-                file_contents += f"[{value}] = {value_index}"
-                value_index += 1
-            file_contents += "}"
-    file_contents += "\n}"
-    with open(full_filepath, 'w', encoding="utf_8") as file:
-        file.write(file_contents)
+                file.write(",\n")
+            file.write(f"\t[\"{value_category}\"] = {{")
+            file.write(", ".join(f"[\"{to_snake_case(item_name)}\"] = {item_value}"
+                                 for item_name, item_value in values.items()))
+            file.write("}")
+        file.write("\n}\n\n\nSTAGE_MAPPINGS = {\n")
+        if "user" in options:
+            first_option: bool = True
+            for option_name, option_data in options["user"].items():
+                if "type" not in option_data or option_data["type"] != "Choice":
+                    continue
+                if first_option:
+                    first_option = False
+                else:
+                    file.write(",\n")
+                file.write(f"\t[\"{format_to_valid_identifier(option_name)}\"] = {{")
+                file.write(", ".join(f"[{value}] = {value_index}"
+                                     for value_index, value in enumerate(option_data["values"].values())))
+                file.write("}")
+        file.write("\n}")
 
+
+def write_complexity_report(rows: list[dict[str, any]], report_path: str) -> None:
+    if os.path.dirname(report_path) and not os.path.exists(os.path.dirname(report_path)):
+        os.makedirs(os.path.dirname(report_path))
+    with open(report_path, 'w', encoding="utf_8", newline="") as file:
+        if report_path.endswith(".csv"):
+            writer: csv.DictWriter = csv.DictWriter(file, COMPLEXITY_REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, file, indent=4)
@@ -1,3 +1,4 @@
+from profiling import profiled
 from utils import to_snake_case
 
 
@@ -16,6 +17,7 @@ def get_item_groups(items: list[dict[str, any]]) -> dict[str, list[str]]:
     return item_groups
 
 
+@profiled
 def parse_items(items: dict[str, any]) -> tuple[list[dict[str, any]], dict[str, dict[str, int]]]:
     # Create output object for items
     poptracker_items: list[dict[str, any]] = []
@@ -1,17 +1,22 @@
+import hashlib
+
 from logic import *
 
 
 LOCATION_ROW_SIZE = 20
 LOCATION_SPACING = 25
+SHARED_RULES_LOCATION = "__shared_rules__"
+CUSTOM_FUNCTION_COST = 10
 
 
+@profiled
 def build_region_graph(regions: dict[str, any]) -> dict[str, list[str]]:
     region_graph: dict[str, list[str]] = {"__start__": []}
     for region, region_data in regions.items():
         if "connects_to" in region_data and region_data["connects_to"]:
             region_graph[region] = region_data["connects_to"]
         else:
-            region_graph["region"] = []
+            region_graph[region] = []
         if "starting" in region_data and region_data["starting"]:
             region_graph["__start__"].append(region)
     if not region_graph["__start__"]:
@@ -56,6 +61,203 @@ def get_logic_from_paths(paths: list[list[str]], regions: dict[str, any]) -> Log
     return or_logic
 
 
+def get_strongly_connected_components(region_graph: dict[str, list[str]]) -> list[list[str]]:
+    # iterative Tarjan's algorithm; components come out in reverse topological order
+    nodes: list[str] = list(region_graph.keys())
+    for connections in region_graph.values():
+        nodes.extend(region for region in connections if region not in region_graph)
+    index_of: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    on_stack: set[str] = set()
+    stack: list[str] = []
+    components: list[list[str]] = []
+    next_index: int = 0
+    for root in nodes:
+        if root in index_of:
+            continue
+        work: list[tuple[str, int]] = [(root, 0)]
+        while work:
+            region, child_index = work.pop()
+            if child_index == 0:
+                index_of[region] = next_index
+                lowlink[region] = next_index
+                next_index += 1
+                stack.append(region)
+                on_stack.add(region)
+            children: list[str] = region_graph.get(region, [])
+            recursed: bool = False
+            while child_index < len(children):
+                child: str = children[child_index]
+                child_index += 1
+                if child not in index_of:
+                    work.append((region, child_index))
+                    work.append((child, 0))
+                    recursed = True
+                    break
+                elif child in on_stack:
+                    lowlink[region] = min(lowlink[region], index_of[child])
+            if recursed:
+                continue
+            if lowlink[region] == index_of[region]:
+                component: list[str] = []
+                while True:
+                    member: str = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == region:
+                        break
+                components.append(component)
+            if work:
+                parent: str = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[region])
+    return components
+
+
+def get_logic_key(logic: Logic) -> frozenset[frozenset[str]]:
+    return frozenset(frozenset(operand.value.prim_value for operand in and_operand.value.operands)
+                     for and_operand in logic.operands)
+
+
+def get_region_logic_fixed_point(region_graph: dict[str, list[str]],
+                                 regions: dict[str, any],
+                                 item_groups: dict[str, list[str]]) -> dict[str, Logic]:
+    # an OR with a single empty AND is always true; an OR with no operands is never true
+    always: Logic = Logic(op=Operator.OR, operands=[Operand(value=Logic(op=Operator.AND, operands=[], prim_value=""))],
+                          prim_value="")
+    never: Logic = Logic(op=Operator.OR, operands=[], prim_value="")
+    predecessors: dict[str, list[str]] = {}
+    for region, connections in region_graph.items():
+        for next_region in connections:
+            predecessors.setdefault(next_region, []).append(region)
+
+    requirements: dict[str, Logic] = {}
+
+    def get_requirement(region: str) -> Logic:
+        if region not in requirements:
+            region_data: dict[str, any] = regions.get(region, {})
+            if region != "__start__" and "requires" in region_data and region_data["requires"]:
+                requirement: Logic = convert_to_dnf(parse_logic(region_data["requires"]))
+                requirements[region] = reduce_logic(requirement, item_groups)
+            else:
+                requirements[region] = always
+        return requirements[region]
+
+    access: dict[str, Logic] = {}
+    for component in reversed(get_strongly_connected_components(region_graph)):
+        members: set[str] = set(component)
+        # entry logic from regions outside this component is already final
+        entry_logic: dict[str, list[Operand]] = {}
+        for region in component:
+            entry_operands: list[Operand] = [Operand(value=always)] if region == "__start__" else []
+            for predecessor in predecessors.get(region, []):
+                if predecessor not in members:
+                    entry_operands.extend(access[predecessor].operands)
+            entry_logic[region] = entry_operands
+            access[region] = never
+        changed: bool = True
+        while changed:
+            changed = False
+            for region in component:
+                incoming_operands: list[Operand] = list(entry_logic[region])
+                for predecessor in predecessors.get(region, []):
+                    if predecessor in members:
+                        incoming_operands.extend(access[predecessor].operands)
+                if not incoming_operands:
+                    continue
+                incoming_logic: Logic = Logic(op=Operator.OR, operands=incoming_operands, prim_value="")
+                region_logic: Logic = Logic(op=Operator.AND,
+                                            operands=[Operand(value=get_requirement(region)),
+                                                      Operand(value=incoming_logic)],
+                                            prim_value="")
+                region_logic = reduce_logic(convert_to_dnf(region_logic), item_groups)
+                if get_logic_key(region_logic) != get_logic_key(access[region]):
+                    access[region] = region_logic
+                    changed = True
+
+    # match the path-based output, which leaves both free and unreachable regions without rules; unlike it, a region
+    # free along only some of its paths is free here too, where the path-based output keeps the other paths' rules
+    for region, region_logic in access.items():
+        if get_logic_key(region_logic) == get_logic_key(always):
+            access[region] = never
+    return access
+
+
+class RegionLogicTable:
+    def __init__(self,
+                 regions: dict[str, any],
+                 region_graph: dict[str, list[str]],
+                 item_groups: dict[str, list[str]],
+                 mode: str = "paths"):
+        if mode not in ["paths", "fixed_point"]:
+            raise ValueError(f"Unknown region logic mode {mode}")
+        self.regions: dict[str, any] = regions
+        self.region_graph: dict[str, list[str]] = region_graph
+        self.item_groups: dict[str, list[str]] = item_groups
+        self.mode: str = mode
+        self.hits: int = 0
+        self.misses: int = 0
+        self._fixed_point_logic: dict[str, Logic] | None = None
+        self._access_rules: dict[str, tuple[list[str], dict[str, int]]] = {}
+        # region -> (paths, DNF clauses, reduced DNF clauses), recorded while the logic is built, for the complexity
+        # report; the fixed point reduces as it goes, so it has no paths or unreduced clauses to count
+        self._logic_counts: dict[str, tuple[int | None, int | None, int]] = {}
+
+    def get_region_logic(self, region: str) -> Logic:
+        if self.mode == "fixed_point":
+            if self._fixed_point_logic is None:
+                with profile_phase("get_region_logic_fixed_point"):
+                    self._fixed_point_logic = get_region_logic_fixed_point(self.region_graph, self.regions,
+                                                                           self.item_groups)
+            region_logic: Logic = self._fixed_point_logic.get(region, Logic(op=Operator.OR, operands=[],
+                                                                            prim_value=""))
+            self._logic_counts[region] = (None, None, len(region_logic.operands))
+            return region_logic
+        with profile_phase("get_all_paths"):
+            region_paths: list[list[str]] = get_all_paths(self.region_graph, "__start__", region, [])
+        with profile_phase("get_logic_from_paths"):
+            region_logic: Logic = get_logic_from_paths(region_paths, self.regions)
+        with profile_phase("reduce_logic"):
+            reduced_logic: Logic = reduce_logic(region_logic, self.item_groups)
+        self._logic_counts[region] = (len(region_paths), len(region_logic.operands), len(reduced_logic.operands))
+        return reduced_logic
+
+    def get_access_rules(self, region: str) -> tuple[list[str], dict[str, int]]:
+        if region in self._access_rules:
+            self.hits += 1
+        else:
+            self.misses += 1
+            region_logic: Logic = self.get_region_logic(region)
+            with profile_phase("convert_dnf_logic_to_json_object"):
+                self._access_rules[region] = convert_dnf_logic_to_json_object(region_logic)
+        return self._access_rules[region]
+
+    def get_complexity(self, region: str) -> dict[str, any]:
+        rule: str = self.regions[region].get("requires", "")
+        complexity: dict[str, any] = {"rule_length": len(rule),
+                                      "parse_depth": get_logic_depth(parse_logic(rule)) if rule else 0}
+        # only regions no location is in were never converted, and have their logic built just for the report
+        if region not in self._logic_counts:
+            self.get_region_logic(region)
+        region_paths, dnf_clauses, reduced_dnf_clauses = self._logic_counts[region]
+        return complexity | {"region_paths": region_paths, "dnf_clauses": dnf_clauses,
+                             "reduced_dnf_clauses": reduced_dnf_clauses}
+
+    def get_logic_counts(self, region: str) -> tuple[int | None, int | None, int] | None:
+        return self._logic_counts.get(region)
+
+    def import_logic_counts(self, logic_counts: dict[str, tuple[int | None, int | None, int]]) -> None:
+        self._logic_counts |= logic_counts
+
+    def get_uncached_regions(self, regions: list[str]) -> list[str]:
+        return [region for region in regions if region not in self._access_rules]
+
+    def export_access_rules(self, regions: list[str]) -> dict[str, tuple[list[str], dict[str, int]]]:
+        return {region: self._access_rules[region] for region in regions}
+
+    def import_access_rules(self, access_rules: dict[str, tuple[list[str], dict[str, int]]]) -> None:
+        self._access_rules |= access_rules
+
+
 def group_locations_by_key(key: str, locations: list[dict[str, any]]) -> dict[str, list[dict[str, any]]]:
     grouped_locations: dict[str, list[dict[str, any]]] = {}
     for location in locations:
@@ -75,17 +277,90 @@ def group_locations_by_key(key: str, locations: list[dict[str, any]]) -> dict[st
     return grouped_locations
 
 
+def count_location_squares(locations: list[dict[str, any]]) -> int:
+    return len(group_locations_by_key("region", locations))
+
+
+def get_affected_regions(old_regions: dict[str, any],
+                         new_regions: dict[str, any],
+                         old_region_graph: dict[str, list[str]],
+                         new_region_graph: dict[str, list[str]]) -> set[str]:
+    affected_regions: set[str] = {region for region in old_regions.keys() | new_regions.keys()
+                                  if old_regions.get(region) != new_regions.get(region)}
+    if old_region_graph["__start__"] != new_region_graph["__start__"]:
+        affected_regions.add("__start__")
+    # a region's access rules depend on every region on the way to it, so changes carry over to every region past them
+    regions_to_visit: list[str] = list(affected_regions)
+    while regions_to_visit:
+        region: str = regions_to_visit.pop()
+        for region_graph in [old_region_graph, new_region_graph]:
+            for next_region in region_graph.get(region, []):
+                if next_region not in affected_regions:
+                    affected_regions.add(next_region)
+                    regions_to_visit.append(next_region)
+    return affected_regions
+
+
+# The inputs shared by every group a worker process builds, set once per process by init_locations_worker
+WORKER_STATE: dict[str, any] = {}
+
+
+def init_locations_worker(regions: dict[str, any],
+                          region_graph: dict[str, list[str]],
+                          item_groups: dict[str, list[str]],
+                          visibility_options: dict[str, list[str]],
+                          region_logic_mode: str,
+                          rule_cache_size: int,
+                          max_dnf_clauses: int,
+                          rule_cache_entries: list[tuple[tuple[str, str], AccessRules]]) -> None:
+    rule_cache: RuleCache = RuleCache(item_groups, rule_cache_size, max_dnf_clauses)
+    rule_cache.add_entries(rule_cache_entries)
+    rule_cache.track_new_entries = True
+    WORKER_STATE["regions"] = regions
+    WORKER_STATE["region_logic_table"] = RegionLogicTable(regions, region_graph, item_groups, region_logic_mode)
+    WORKER_STATE["rule_cache"] = rule_cache
+    WORKER_STATE["visibility_options"] = visibility_options
+
+
+def get_region_access_rules_in_worker(region: str) -> tuple[tuple[list[str], dict[str, int]],
+                                                             tuple[int | None, int | None, int] | None]:
+    region_logic_table: RegionLogicTable = WORKER_STATE["region_logic_table"]
+    return region_logic_table.get_access_rules(region), region_logic_table.get_logic_counts(region)
+
+
+def build_locations_json_in_worker(locations: list[dict[str, any]],
+                                   total_square_count: int,
+                                   parent_group: str,
+                                   region_access_rules: dict[str, tuple[list[str], dict[str, int]]]) -> tuple[tuple[int, set[str], list[dict[str, any]],
+                                                                     dict[str, int], dict[str, str], list[str]],
+                                                               list[tuple[tuple[str, str], AccessRules]],
+                                                               tuple[int, int, int, int]]:
+    region_logic_table: RegionLogicTable = WORKER_STATE["region_logic_table"]
+    rule_cache: RuleCache = WORKER_STATE["rule_cache"]
+    region_logic_table.import_access_rules(region_access_rules)
+    region_logic_table.hits = region_logic_table.misses = rule_cache.hits = rule_cache.misses = 0
+    result = build_locations_json(locations, WORKER_STATE["regions"], region_logic_table, rule_cache,
+                                  WORKER_STATE["visibility_options"], total_square_count, parent_group)
+    cache_counts: tuple[int, int, int, int] = (region_logic_table.hits, region_logic_table.misses, rule_cache.hits,
+                                               rule_cache.misses)
+    return result, rule_cache.take_new_entries(), cache_counts
+
+
+@profiled
 def build_locations_json(locations: list[dict[str, any]],
                          regions: dict[str, any],
-                         region_graph: dict[str, list[str]],
-                         item_groups: dict[str, list[str]],
+                         region_logic_table: RegionLogicTable,
+                         rule_cache: RuleCache,
                          visibility_options: dict[str, str],
                          total_square_count: int,
-                         parent_group: str) -> tuple[int, set[str], list[dict[str, any]], dict[str, int]]:
+                         parent_group: str) -> tuple[int, set[str], list[dict[str, any]], dict[str, int],
+                                                     dict[str, str], list[str]]:
     grouped_by_region: dict[str, list[dict[str, any]]] = group_locations_by_key("region", locations)
     output: list[dict[str, any]] = []
     map_names: set[str] = set()
     functions: dict[str, int] = {}
+    factored_rules: dict[str, str] = {}
+    factored_locations: list[str] = []
     for region, region_locations in grouped_by_region.items():
         if not region_locations:
             continue
@@ -98,11 +373,13 @@ def build_locations_json(locations: list[dict[str, any]],
                 "item_count": 1
             }
             if "requires" in location and location["requires"]:
-                location_logic: Logic = parse_logic(location["requires"])
-                location_logic = convert_to_dnf(location_logic)
-                location_logic = reduce_logic(location_logic, item_groups)
-                section_info["access_rules"], new_functions = convert_dnf_logic_to_json_object(location_logic)
-                functions |= new_functions
+                with profile_phase("location rules", location["name"]):
+                    access_rules: AccessRules = rule_cache.get_access_rules(location["requires"])
+                section_info["access_rules"] = access_rules.rules
+                functions |= access_rules.functions
+                if access_rules.factored_rules:
+                    factored_rules |= access_rules.factored_rules
+                    factored_locations.append(location["name"])
             if "category" in location and location["category"]:
                 visibility_rule: str = ""
                 for category in location["category"]:
@@ -132,9 +409,8 @@ def build_locations_json(locations: list[dict[str, any]],
             "y": y if y >= 0 else (total_square_count // LOCATION_ROW_SIZE) * LOCATION_SPACING
         }
         total_square_count += 1
-        region_paths: list[list[str]] = get_all_paths(region_graph, "__start__", region, [])
-        region_logic: Logic = get_logic_from_paths(region_paths, regions)
-        region_logic_string, new_functions = convert_dnf_logic_to_json_object(reduce_logic(region_logic, item_groups))
+        with profile_phase("region rules", region):
+            region_logic_string, new_functions = region_logic_table.get_access_rules(region)
         functions |= new_functions
         region_entry: dict[str, any] = {
             "name": region.replace("/", "-"),
@@ -144,7 +420,103 @@ def build_locations_json(locations: list[dict[str, any]],
         }
         output.append(region_entry)
     top_level_json: dict[str, any] = {"name": parent_group.replace('/', '-'), "children": output}
-    return total_square_count, map_names, [top_level_json], functions
+    return total_square_count, map_names, [top_level_json], functions, factored_rules, factored_locations
+
+
+def get_primitive_cost(primitive: str,
+                       item_groups: dict[str, list[str]],
+                       item_values: dict[str, dict[str, int]]) -> int:
+    # rough number of ProviderCountForCode calls needed to evaluate the primitive
+    if not primitive.startswith("$"):
+        return 1
+    function_name, _, params = primitive[1:].partition("|")
+    if function_name == "has_count_from_group":
+        return len(item_groups.get(params.rpartition("|")[0], [])) or 1
+    if function_name == "ItemValue":
+        return len(item_values.get(params.partition("|")[0], {})) or 1
+    if function_name in BUILT_IN_FUNCTIONS or function_name == "negate":
+        return 1
+    return CUSTOM_FUNCTION_COST
+
+
+def convert_primitive_to_lua_call(primitive: str) -> str:
+    if primitive.startswith("$"):
+        function_name, *params = primitive[1:].split("|")
+        return f"{function_name}({', '.join(to_lua_string(param) for param in params)})"
+    return convert_item_code_to_lua_check(primitive)
+
+
+def compile_access_rule_function(access_rules: list[str],
+                                 item_groups: dict[str, list[str]],
+                                 item_values: dict[str, dict[str, int]]) -> str:
+    clauses: list[list[str]] = [list(dict.fromkeys(primitive.strip() for primitive in rule.split(",")))
+                                for rule in access_rules]
+    # checks every clause needs are done once, ahead of the clauses, so they still short-circuit the whole rule
+    common: list[str] = [primitive for primitive in clauses[0] if all(primitive in clause for clause in clauses[1:])]
+
+    def get_cost(primitive: str) -> int:
+        return get_primitive_cost(primitive, item_groups, item_values)
+
+    # cheapest checks first, so short-circuiting skips the expensive ones as often as possible
+    ordered_clauses: list[list[str]] = [sorted([primitive for primitive in clause if primitive not in common],
+                                               key=get_cost) for clause in clauses]
+    ordered_clauses.sort(key=lambda clause: sum(get_cost(primitive) for primitive in clause))
+    expressions: list[str] = [f"({convert_primitive_to_lua_call(primitive)})"
+                              for primitive in sorted(common, key=get_cost)]
+    # a clause left with no checks of its own holds whenever the common checks do
+    if all(ordered_clauses):
+        clause_expressions: list[str] = [" and ".join(f"({convert_primitive_to_lua_call(primitive)})"
+                                                      for primitive in clause) for clause in ordered_clauses]
+        expressions.append(f"(({') or ('.join(clause_expressions)}))" if len(clause_expressions) > 1
+                           else clause_expressions[0])
+    return f"\treturn {' and '.join(expressions)}\n"
+
+
+@profiled
+def compile_access_rules(locations_jsons: list[list[dict[str, any]]],
+                         item_groups: dict[str, list[str]],
+                         item_values: dict[str, dict[str, int]]) -> dict[str, str]:
+    # replaces each access rule list with a call to one generated Lua function; identical lists share a function
+    compiled_rules: dict[str, str] = {}
+    pending: list[dict[str, any]] = [entry for locations_json in locations_jsons for entry in locations_json]
+    while pending:
+        entry: dict[str, any] = pending.pop()
+        pending.extend(entry.get("children", []))
+        pending.extend(entry.get("sections", []))
+        if "access_rules" not in entry or not entry["access_rules"]:
+            continue
+        access_rules: list[str] = entry["access_rules"]
+        if len(access_rules) == 1 and access_rules[0].startswith("$factored_rule_"):
+            continue
+        function_name: str = f"compiled_rule_{hashlib.sha1(chr(10).join(access_rules).encode('utf-8')).hexdigest()[:12]}"
+        if function_name not in compiled_rules:
+            compiled_rules[function_name] = compile_access_rule_function(access_rules, item_groups, item_values)
+        entry["access_rules"] = [f"${function_name}"]
+    return compiled_rules
+
+
+@profiled
+def share_access_rules(locations_jsons: list[list[dict[str, any]]]) -> list[dict[str, any]]:
+    # every access rule list used more than once is moved to a hidden location, which the users reference instead
+    rule_users: dict[tuple[str, ...], list[dict[str, any]]] = {}
+    pending: list[dict[str, any]] = [entry for locations_json in locations_jsons for entry in locations_json]
+    while pending:
+        entry: dict[str, any] = pending.pop()
+        if "access_rules" in entry and entry["access_rules"]:
+            rule_users.setdefault(tuple(entry["access_rules"]), []).append(entry)
+        pending.extend(entry.get("children", []))
+        pending.extend(entry.get("sections", []))
+    shared_rules: list[dict[str, any]] = []
+    for access_rules, users in rule_users.items():
+        rule_name: str = f"rule_{hashlib.sha1(chr(10).join(access_rules).encode('utf-8')).hexdigest()[:12]}"
+        # short rules are cheaper inline than as a reference to another location
+        if len(users) < 2 or sum(len(rule) for rule in access_rules) <= len(f"@{SHARED_RULES_LOCATION}/{rule_name}"):
+            continue
+        shared_rules.append({"name": rule_name, "access_rules": list(access_rules)})
+        for user in users:
+            user["access_rules"] = [f"@{SHARED_RULES_LOCATION}/{rule_name}"]
+    shared_rules.sort(key=lambda shared_rule: shared_rule["name"])
+    return [{"name": SHARED_RULES_LOCATION, "children": shared_rules}]
 
 
 def build_maps_json(map_names: set[str]) -> list[dict[str, any]]:
@@ -1,5 +1,11 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
 from typing import NamedTuple
 from enum import Enum
+from profiling import *
 from utils import *
 
 
@@ -85,117 +91,122 @@ def handle_yamlcompare(parameter: str) -> tuple[str, str]:
     return function_name, output_parameters
 
 
-def convert_tokens_to_logic(tokens: list[str]) -> Logic:
-    if len(tokens) == 1:
-        # this is either a string that needs to be tokenized and parsed, or a primitive
-        token: str = tokens[0]
-        if token.startswith("|") and token.endswith("|") and token.count("|") == 2:
-            # this is a primitive
-            return Logic(op=Operator.PRIMITIVE, operands=[], prim_value=token[1:-1])
-        elif token.startswith("{") and token.endswith("}") and token.count("{") == 1:
-            # this is a function, write as a primitive in PopTracker function syntax
-            function_name: str = token[1:token.find("(")]
-            function_params: str = token[token.find("(")+1:token.find(")")]
-            function_string: str = f"${function_name}"
-            if function_params:
-                modified_param_string: str = ""
-                if function_name == "ItemValue":
-                    # delimiter is a colon
-                    value_category, _, target_value = function_params.partition(":")
-                    modified_param_string = "|" + value_category.strip() + "|" + target_value.strip()
-                elif function_name == "YamlCompare":
-                    # special function just to handle this nonsense
-                    new_function_name, modified_param_string = handle_yamlcompare(function_params)
-                    function_string = f"${new_function_name}"
-                else:
-                    # delimiter is a comma
-                    param_list: list[str] = function_params.split(",")
-                    for param in param_list:
-                        modified_param_string += "|" + param.strip()
-                function_string += modified_param_string
-            return Logic(op=Operator.PRIMITIVE, operands=[], prim_value=function_string)
+class TokenType(Enum):
+    OPEN_PAREN = 0
+    CLOSE_PAREN = 1
+    AND = 2
+    OR = 3
+    ITEM = 4
+    FUNCTION = 5
+
+
+class Token(NamedTuple):
+    type: TokenType
+    value: str
+    column: int
+
+
+def convert_function_to_primitive(token: str) -> Logic:
+    # write functions as primitives in PopTracker function syntax
+    function_name: str = token[1:token.find("(")]
+    function_params: str = token[token.find("(")+1:token.find(")")]
+    function_string: str = f"${function_name}"
+    if function_params:
+        modified_param_string: str = ""
+        if function_name == "ItemValue":
+            # delimiter is a colon
+            value_category, _, target_value = function_params.partition(":")
+            modified_param_string = "|" + value_category.strip() + "|" + target_value.strip()
+        elif function_name == "YamlCompare":
+            # special function just to handle this nonsense
+            new_function_name, modified_param_string = handle_yamlcompare(function_params)
+            function_string = f"${new_function_name}"
         else:
-            # this is a string that needs to be further broken down
-            return parse_logic(token)
-
-    # check to see if top-level operators all match
-    if "or" in tokens:
-        # top-level operator should be an or, so group the ands together
-        return_logic: Logic = Logic(op=Operator.OR, operands=[], prim_value="")
-        while "or" in tokens:
-            or_index = tokens.index("or")
-            subtokens = tokens[0:or_index]
-            subtoken_logic: Logic = convert_tokens_to_logic(subtokens)
-            return_logic.operands.append(Operand(value=subtoken_logic))
-            tokens = tokens[or_index+1:]
-        subtoken_logic: Logic = convert_tokens_to_logic(tokens)
-        return_logic.operands.append(Operand(value=subtoken_logic))
-        return return_logic
-    elif "and" in tokens:
-        # there are no ors, so everything should be and-ed
-        return_logic: Logic = Logic(op=Operator.AND, operands=[], prim_value="")
-        while "and" in tokens:
-            and_index = tokens.index("and")
-            subtokens = tokens[0:and_index]
-            subtoken_logic: Logic = convert_tokens_to_logic(subtokens)
-            return_logic.operands.append(Operand(value=subtoken_logic))
-            tokens = tokens[and_index+1:]
-        subtoken_logic: Logic = convert_tokens_to_logic(tokens)
-        return_logic.operands.append(Operand(value=subtoken_logic))
-        return return_logic
-    else:
-        # multiple tokens, but no operators; raise an exception
-        raise SyntaxError(f"Found two operands with no operator {tokens}")
+            # delimiter is a comma
+            param_list: list[str] = function_params.split(",")
+            for param in param_list:
+                modified_param_string += "|" + param.strip()
+        function_string += modified_param_string
+    return Logic(op=Operator.PRIMITIVE, operands=[], prim_value=function_string)
+
+
+LOGIC_TOKEN_PATTERN = re.compile(r"\s*(?:(?P<OPEN_PAREN>\()|(?P<CLOSE_PAREN>\))|(?P<ITEM>\|[^|]*\|)"
+                                 r"|(?P<FUNCTION>\{[^}]*\})|(?P<AND>and)|(?P<OR>or)|(?P<ERROR>\S))",
+                                 re.IGNORECASE | re.DOTALL)
+TOKEN_TYPES_BY_GROUP = {token_type.name: token_type for token_type in TokenType}
+
+
+def tokenize_logic(logic: str) -> list[Token]:
+    # columns are 1-based so they can be reported to the user as-is
+    tokens: list[Token] = []
+    for match in LOGIC_TOKEN_PATTERN.finditer(logic):
+        group: str = match.lastgroup
+        value: str = match.group(group)
+        column: int = match.start(group) + 1
+        if group == "ERROR":
+            if value == "|":
+                raise SyntaxError(f"Mismatched pipes starting at column {column} of rule {logic}")
+            if value == "{":
+                raise SyntaxError(f"Mismatched braces starting at column {column} of rule {logic}")
+            raise SyntaxError(f"Unrecognized logic syntax at column {column} of rule {logic}")
+        # earlier versions accepted function calls without parentheses, but wrote broken rules for them
+        if group == "FUNCTION" and "(" not in value:
+            raise SyntaxError(f"Function call {value} at column {column} of rule {logic} has no parentheses; write it "
+                              f"as {{{value[1:-1].strip()}()}}")
+        if group == "FUNCTION" and "{" in value[1:]:
+            raise SyntaxError(f"Malformed function call starting at column {column} of rule {logic}")
+        tokens.append(Token(TOKEN_TYPES_BY_GROUP[group], value, column))
+    return tokens
+
+
+def combine_operands(op: Operator, operands: list[Operand]) -> Logic:
+    # a single operand stands on its own rather than being wrapped in a one-element AND or OR
+    if len(operands) == 1:
+        return operands[0].value
+    return Logic(op, operands, "")
 
 
 def parse_logic(logic: str) -> Logic:
-    index: int = 0
-    tokens: list[str] = []
-    # tokenize the logic
-    while index < len(logic):
-        current_char: str = logic[index:index+1]
-        if current_char == '(':
-            # parentheses: find the matching close paren
-            cur_depth: int = 1
-            inner_index = index + 1
-            while cur_depth >= 1 and inner_index <= len(logic):
-                inner_char: str = logic[inner_index:inner_index+1]
-                if inner_char == '(':
-                    cur_depth += 1
-                elif inner_char == ')':
-                    cur_depth -= 1
-                inner_index += 1
-            if cur_depth != 0:
-                raise SyntaxError(f"Mismatched parenthesis starting at index {index} for rule {logic}")
-            tokens.append(logic[index+1:inner_index-1])
-            index = inner_index + 1
-        elif current_char == '|':
-            end_index = logic.find("|", index+1)
-            if end_index == -1:
-                raise SyntaxError(f"Mismatched pipes starting at index {index} for rule {logic}")
-            tokens.append(logic[index:end_index+1])
-            index = end_index + 1
-        elif current_char == '{':
-            end_index = logic.find("}", index+1)
-            if end_index == -1:
-                raise SyntaxError(f"Mismatched braces starting at index {index} for rule {logic}")
-            tokens.append(logic[index:end_index+1])
-            index = end_index + 1
-        elif current_char.isspace():
-            index += 1
-            continue
-        else:
-            # should be an operator
-            if logic[index:index+3].lower() == "and":
-                index += 3
-                tokens.append("and")
-            elif logic[index:index+2].lower() == "or":
-                index += 2
-                tokens.append("or")
+    # "and" binds tighter than "or"; each open parenthesis saves the enclosing operands until it is closed
+    enclosing: list[tuple[int, list[Operand], list[Operand]]] = []
+    or_operands: list[Operand] = []
+    and_operands: list[Operand] = []
+    expecting_operand: bool = True
+    for token_type, value, column in tokenize_logic(logic):
+        if token_type is TokenType.ITEM or token_type is TokenType.FUNCTION or token_type is TokenType.OPEN_PAREN:
+            if not expecting_operand:
+                raise SyntaxError(f"Found two operands with no operator at column {column} of rule {logic}")
+            if token_type is TokenType.ITEM:
+                and_operands.append(Operand(Logic(Operator.PRIMITIVE, [], value[1:-1])))
+                expecting_operand = False
+            elif token_type is TokenType.FUNCTION:
+                and_operands.append(Operand(convert_function_to_primitive(value)))
+                expecting_operand = False
             else:
-                raise SyntaxError(f"Unrecognized logic syntax at index {index} of rule {logic}")
-
-    return convert_tokens_to_logic(tokens)
+                enclosing.append((column, or_operands, and_operands))
+                or_operands = []
+                and_operands = []
+        elif expecting_operand:
+            raise SyntaxError(f"Expected an operand but found '{value}' at column {column} of rule {logic}")
+        elif token_type is TokenType.AND:
+            expecting_operand = True
+        elif token_type is TokenType.OR:
+            or_operands.append(Operand(combine_operands(Operator.AND, and_operands)))
+            and_operands = []
+            expecting_operand = True
+        else:
+            if not enclosing:
+                raise SyntaxError(f"Unmatched closing parenthesis at column {column} of rule {logic}")
+            or_operands.append(Operand(combine_operands(Operator.AND, and_operands)))
+            group_logic: Logic = combine_operands(Operator.OR, or_operands)
+            _, or_operands, and_operands = enclosing.pop()
+            and_operands.append(Operand(group_logic))
+    if expecting_operand:
+        raise SyntaxError(f"Unexpected end of rule at column {len(logic)+1} of rule {logic}")
+    if enclosing:
+        raise SyntaxError(f"Mismatched parenthesis starting at column {enclosing[-1][0]} of rule {logic}")
+    or_operands.append(Operand(combine_operands(Operator.AND, and_operands)))
+    return combine_operands(Operator.OR, or_operands)
 
 
 def is_dnf(logic: Logic) -> bool:
@@ -276,83 +287,84 @@ def print_logic(logic: Logic) -> str:
     return return_str
 
 
+class ReducibleClause(NamedTuple):
+    primitives: set[str]
+    item_mask: int
+    group_counts: dict[int, int]
+
+
 def reduce_logic(logic: Logic, item_groups: dict[str, list[str]]) -> Logic:
     if not is_dnf(logic):
         raise AssertionError(f"reduce_logic works with logic in DNF form only! {logic}")
-    # first reduce all the children
-    all_primitive_sets: list(set(str)) = []
+    # non-group primitives are interned to bit positions and item groups to ids, so each clause becomes an int
+    # bitmask plus a small group id -> count mapping
+    primitive_bits: dict[str, int] = {}
+    group_ids: dict[str, int] = {}
+    group_names: list[str] = []
+
+    # first reduce all the children, keeping only the highest count requested from each item group
+    clauses: list[ReducibleClause] = []
     for or_operand in logic.operands:
-        primitive_set: set(str) = set()
-        item_group_counts: dict[str, int] = {}
+        item_mask: int = 0
+        group_counts: dict[int, int] = {}
+        group_count_strings: dict[int, str] = {}
+        primitive_set: set[str] = set()
         for and_operand in or_operand.value.operands:
             value: str = and_operand.value.prim_value
             if value.startswith("@"):
                 item_group: str = value[1:value.index(":")]
-                count: int = value[value.index(":")+1:len(value)]
-                if item_group in item_group_counts:
-                    if count > item_group_counts[item_group]:
-                        item_group_counts[item_group] = count
-                else:
-                    item_group_counts[item_group] = count
+                count_string: str = value[value.index(":")+1:]
+                count: int = int(count_string)
+                if item_group not in group_ids:
+                    group_ids[item_group] = len(group_names)
+                    group_names.append(item_group)
+                group_id: int = group_ids[item_group]
+                if group_id not in group_counts or count > group_counts[group_id]:
+                    group_counts[group_id] = count
+                    group_count_strings[group_id] = count_string
             else:
+                if value not in primitive_bits:
+                    primitive_bits[value] = len(primitive_bits)
+                item_mask |= 1 << primitive_bits[value]
                 primitive_set.add(value)
-        for item_group, count in item_group_counts.items():
-            primitive_set.add(f"@{item_group}:{str(count)}")
-        all_primitive_sets.append(primitive_set)
-
-    # second, check for subsets
-    def sort_key(s: set) -> int:
-        return len(s)
-    all_primitive_sets.sort(key=sort_key)
-    relevant_primitive_sets: list(set(str)) = []
-    for primitive_set in all_primitive_sets:
-        potential_item_group_counts: dict[str, int] = {}
-        potential_comparison_set: set(str) = set()
-        for potential_primitive in list(sorted(primitive_set)):
-            if potential_primitive.startswith("@"):
-                item_group: str = potential_primitive[1:potential_primitive.index(":")]
-                count: int = int(potential_primitive[potential_primitive.index(":")+1:len(potential_primitive)])
-                potential_item_group_counts[item_group] = count
-            else:
-                potential_comparison_set.add(potential_primitive)
-        for relevant_primitive_set in relevant_primitive_sets:
-            relevant_item_group_counts: dict[str, int] = {}
-            relevant_comparison_set: set(str) = set()
-            for relevant_primitive in list(sorted(relevant_primitive_set)):
-                if relevant_primitive.startswith("@"):
-                    item_group: str = relevant_primitive[1:relevant_primitive.index(":")]
-                    count: int = int(relevant_primitive[relevant_primitive.index(":")+1:len(relevant_primitive)])
-                    relevant_item_group_counts[item_group] = count
-                else:
-                    relevant_comparison_set.add(relevant_primitive)
-            if not (potential_comparison_set >= relevant_comparison_set):
+        for group_id, count_string in group_count_strings.items():
+            primitive_set.add(f"@{group_names[group_id]}:{count_string}")
+        clauses.append(ReducibleClause(primitives=primitive_set, item_mask=item_mask, group_counts=group_counts))
+
+    # second, drop every clause that is implied by a smaller one
+    group_masks: dict[int, int] = {}
+
+    def get_group_mask(group_id: int) -> int:
+        if group_id not in group_masks:
+            group_mask: int = 0
+            for item in item_groups[group_names[group_id]]:
+                if item in primitive_bits:
+                    group_mask |= 1 << primitive_bits[item]
+            group_masks[group_id] = group_mask
+        return group_masks[group_id]
+
+    clauses.sort(key=lambda clause: len(clause.primitives))
+    relevant_clauses: list[ReducibleClause] = []
+    for clause in clauses:
+        for relevant_clause in relevant_clauses:
+            if relevant_clause.item_mask & ~clause.item_mask:
                 continue
-            for item_group, relevant_count in relevant_item_group_counts.items():
-                if item_group in potential_item_group_counts and potential_item_group_counts[item_group] >= relevant_count:
+            for group_id, relevant_count in relevant_clause.group_counts.items():
+                if clause.group_counts.get(group_id, -1) >= relevant_count:
                     continue
-                else:
-                    item_group_list: list[str] = item_groups[item_group]
-                    found_count: int = 0
-                    for potential_item in list(sorted(potential_comparison_set)):
-                        if potential_item in item_group_list:
-                            found_count += 1
-                            if found_count >= relevant_count:
-                                # we found enough, move on to the next group
-                                break
-                    else:
-                        # we didn't find enough, give up
-                        break
+                if (clause.item_mask & get_group_mask(group_id)).bit_count() < relevant_count:
+                    break
             else:
-                # we found enough of everything, so this set is not relevant
+                # we found enough of everything, so this clause is not relevant
                 break
         else:
-            relevant_primitive_sets.append(primitive_set)
+            relevant_clauses.append(clause)
 
     # third, build back up into Logic
     new_or_operands: list[Operand] = []
-    for primitive_set in relevant_primitive_sets:
+    for clause in relevant_clauses:
         new_and_operands: list[Operand] = []
-        for primitive in sorted(list(primitive_set)):
+        for primitive in sorted(clause.primitives):
             new_and_operands.append(Operand(value=Logic(op=Operator.PRIMITIVE, operands=[], prim_value=primitive)))
         new_and_logic: Logic = Logic(op=Operator.AND, operands=new_and_operands, prim_value="")
         new_or_operands.append(Operand(value=new_and_logic))
@@ -360,6 +372,65 @@ def reduce_logic(logic: Logic, item_groups: dict[str, list[str]]) -> Logic:
     return new_or_logic
 
 
+def add_custom_function(prim_value: str, functions: dict[str, int]) -> None:
+    function_name: str = prim_value[1:]
+    pipe_index: int = prim_value.find("|")
+    if pipe_index >= 0:
+        function_name: str = prim_value[1:pipe_index]
+    if function_name not in BUILT_IN_FUNCTIONS and function_name not in functions:
+        functions[function_name] = prim_value.count("|")
+
+
+def count_dnf_clauses(logic: Logic) -> int:
+    # upper bound on the number of clauses convert_to_dnf produces, before reduce_logic removes any
+    if logic.op == Operator.PRIMITIVE:
+        return 1
+    child_counts: list[int] = [count_dnf_clauses(operand.value) for operand in logic.operands]
+    if logic.op == Operator.OR:
+        return sum(child_counts)
+    clause_count: int = 1
+    for child_count in child_counts:
+        clause_count *= child_count
+    return clause_count
+
+
+def get_logic_depth(logic: Logic) -> int:
+    if logic.op == Operator.PRIMITIVE:
+        return 1
+    return 1 + max([get_logic_depth(operand.value) for operand in logic.operands], default=0)
+
+
+def to_lua_string(value: str) -> str:
+    return "\"" + value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") + "\""
+
+
+def convert_item_code_to_lua_check(code: str) -> str:
+    # a code with a count (code:count) needs at least that many of the item, like it does in the JSON rules
+    item_code, separator, count = code.rpartition(":")
+    if separator and count.isdigit():
+        return f"Tracker:ProviderCountForCode({to_lua_string(item_code)}) >= {count}"
+    return f"Tracker:ProviderCountForCode({to_lua_string(code)}) > 0"
+
+
+def convert_logic_to_lua_expression(logic: Logic, functions: dict[str, int]) -> str:
+    # keeps the rule in its original nested form, so its size stays linear in the size of the rule
+    if logic.op == Operator.PRIMITIVE:
+        prim_value: str = logic.prim_value
+        if prim_value.startswith("@"):
+            item_group: str = prim_value[1:prim_value.index(":")]
+            count: int = int(prim_value[prim_value.index(":")+1:len(prim_value)])
+            return f"has_count_from_group({to_lua_string(item_group)}, {count})"
+        elif prim_value.startswith("$"):
+            add_custom_function(prim_value, functions)
+            function_name, *params = prim_value[1:].split("|")
+            return f"{function_name}({', '.join(to_lua_string(param) for param in params)})"
+        else:
+            return f"({convert_item_code_to_lua_check(to_snake_case(prim_value))})"
+    operator: str = " and " if logic.op == Operator.AND else " or "
+    return "(" + operator.join(convert_logic_to_lua_expression(operand.value, functions)
+                               for operand in logic.operands) + ")"
+
+
 def convert_dnf_logic_to_json_object(logic: Logic) -> tuple[list[str], dict[str, int]]:
     if not is_dnf(logic):
         raise AssertionError(f"convert_dnf_logic_to_json_object works with logic in DNF form only! {logic}")
@@ -379,14 +450,130 @@ def convert_dnf_logic_to_json_object(logic: Logic) -> tuple[list[str], dict[str,
                 count: int = int(prim_value[prim_value.index(":")+1:len(prim_value)])
                 operand_string += f"$has_count_from_group|{item_group}|{count}"
             elif prim_value.startswith("$"):
-                function_name: str = prim_value[1:]
-                pipe_index: int = prim_value.find("|")
-                if pipe_index >= 0:
-                    function_name: str = prim_value[1:pipe_index]
-                if function_name not in BUILT_IN_FUNCTIONS and function_name not in functions:
-                    functions[function_name] = prim_value.count("|")
+                add_custom_function(prim_value, functions)
                 operand_string += prim_value
             else:
                 operand_string += to_snake_case(prim_value)
         json_object.append(operand_string)
     return json_object, functions
+
+
+def get_rule_settings_fingerprint(item_groups: dict[str, list[str]], max_dnf_clauses: int) -> str:
+    settings: list[any] = [item_groups, max_dnf_clauses]
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AccessRules(NamedTuple):
+    rules: list[str]
+    functions: dict[str, int]
+    # Lua functions, by name, for rules too large to expand into DNF
+    factored_rules: dict[str, str]
+
+
+class RuleCache:
+    CACHE_FILE_VERSION = 3
+
+    def __init__(self, item_groups: dict[str, list[str]], max_size: int = 4096, max_dnf_clauses: int = 0):
+        if max_size < 1:
+            raise ValueError(f"Rule cache size must be at least 1! Given size: {max_size}")
+        self.item_groups: dict[str, list[str]] = item_groups
+        self.max_dnf_clauses: int = max_dnf_clauses
+        self.fingerprint: str = get_rule_settings_fingerprint(item_groups, max_dnf_clauses)
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[tuple[str, str], AccessRules] = OrderedDict()
+        # worker processes keep the entries converted since the last take_new_entries call, to hand them back
+        self.track_new_entries: bool = False
+        self._new_entries: list[tuple[tuple[str, str], AccessRules]] = []
+
+    def _store(self, key: tuple[str, str], value: AccessRules) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_access_rules(self, rule: str) -> AccessRules:
+        key: tuple[str, str] = (rule, self.fingerprint)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        with profile_phase("parse_logic"):
+            rule_logic: Logic = parse_logic(rule)
+        with profile_phase("count_dnf_clauses"):
+            factor_rule: bool = bool(self.max_dnf_clauses) and count_dnf_clauses(rule_logic) > self.max_dnf_clauses
+        if factor_rule:
+            with profile_phase("convert_logic_to_lua_expression"):
+                functions: dict[str, int] = {}
+                lua_expression: str = convert_logic_to_lua_expression(rule_logic, functions)
+            function_name: str = f"factored_rule_{hashlib.sha1(rule.encode('utf-8')).hexdigest()[:12]}"
+            value: AccessRules = AccessRules(rules=[f"${function_name}"], functions=functions,
+                                             factored_rules={function_name: lua_expression})
+        else:
+            with profile_phase("convert_to_dnf"):
+                rule_logic = convert_to_dnf(rule_logic)
+            with profile_phase("reduce_logic"):
+                rule_logic = reduce_logic(rule_logic, self.item_groups)
+            with profile_phase("convert_dnf_logic_to_json_object"):
+                access_rules, functions = convert_dnf_logic_to_json_object(rule_logic)
+            value: AccessRules = AccessRules(rules=access_rules, functions=functions, factored_rules={})
+        self._store(key, value)
+        if self.track_new_entries:
+            self._new_entries.append((key, value))
+        return value
+
+    def get_complexity(self, rule: str) -> dict[str, any]:
+        # measured outside the cache, so every rule is converted again however often it was seen
+        if not rule:
+            return {"rule_length": 0, "parse_depth": 0, "dnf_clauses": 0, "reduced_dnf_clauses": 0,
+                    "factored": False}
+        rule_logic: Logic = parse_logic(rule)
+        complexity: dict[str, any] = {"rule_length": len(rule), "parse_depth": get_logic_depth(rule_logic)}
+        dnf_clause_count: int = count_dnf_clauses(rule_logic)
+        if self.max_dnf_clauses and dnf_clause_count > self.max_dnf_clauses:
+            # too large to expand, so only the upper bound on the clause count is known
+            return complexity | {"dnf_clauses": dnf_clause_count, "reduced_dnf_clauses": None, "factored": True}
+        rule_logic = convert_to_dnf(rule_logic)
+        return complexity | {"dnf_clauses": len(rule_logic.operands),
+                             "reduced_dnf_clauses": len(reduce_logic(rule_logic, self.item_groups).operands),
+                             "factored": False}
+
+    def get_entries(self) -> list[tuple[tuple[str, str], AccessRules]]:
+        return list(self._entries.items())
+
+    def add_entries(self, entries: list[tuple[tuple[str, str], AccessRules]]) -> None:
+        for key, value in entries:
+            self._store(key, value)
+
+    def take_new_entries(self) -> list[tuple[tuple[str, str], AccessRules]]:
+        new_entries: list[tuple[tuple[str, str], AccessRules]] = self._new_entries
+        self._new_entries = []
+        return new_entries
+
+    @profiled
+    def load(self, cache_path: str) -> None:
+        if not os.path.exists(cache_path):
+            return
+        with open(cache_path, 'r', encoding="utf_8") as file:
+            try:
+                cache_data: dict[str, any] = json.load(file)
+            except json.JSONDecodeError:
+                print(f"WARNING! Rule cache at {cache_path} is not valid JSON, ignoring it.")
+                return
+        if cache_data.get("version") != self.CACHE_FILE_VERSION:
+            return
+        # entries are saved least recently used first, so replaying them restores the LRU order
+        for rule, fingerprint, access_rules, functions, factored_rules in cache_data["entries"]:
+            self._store((rule, fingerprint), AccessRules(rules=access_rules, functions=functions,
+                                                         factored_rules=factored_rules))
+
+    @profiled
+    def save(self, cache_path: str) -> None:
+        if os.path.dirname(cache_path) and not os.path.exists(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        entries: list[list[any]] = [[rule, fingerprint, value.rules, value.functions, value.factored_rules]
+                                    for (rule, fingerprint), value in self._entries.items()]
+        with open(cache_path, 'w', encoding="utf_8") as file:
+            json.dump({"version": self.CACHE_FILE_VERSION, "entries": entries}, file)
@@ -0,0 +1,100 @@
+import contextlib
+import functools
+import time
+import tracemalloc
+from typing import Callable, ContextManager, Iterator
+
+
+class PhaseStats:
+    def __init__(self, index: int) -> None:
+        # the order phases were first seen in, used to print them as a tree
+        self.index: int = index
+        self.seconds: float = 0.0
+        self.calls: int = 0
+        self.peak_memory: int = 0
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.phases: dict[tuple[str, ...], PhaseStats] = {}
+        # phase name -> subject (like a location or region name) -> seconds spent on it in that phase
+        self.subject_seconds: dict[str, dict[str, float]] = {}
+        self._stack: list[str] = []
+        # the highest traced memory seen by each open phase so far, since nested phases reset the traced peak
+        self._peaks: list[int] = []
+
+    def start(self) -> None:
+        self.phases = {}
+        self.subject_seconds = {}
+        self.enabled = True
+        tracemalloc.start()
+
+    def stop(self) -> None:
+        self.enabled = False
+        tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, subject: str | None = None) -> Iterator[None]:
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        self._stack.append(name)
+        key: tuple[str, ...] = tuple(self._stack)
+        if key not in self.phases:
+            self.phases[key] = PhaseStats(len(self.phases))
+        self._peaks.append(0)
+        tracemalloc.reset_peak()
+        start_time: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds: float = time.perf_counter() - start_time
+            peak_memory: int = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            self._stack.pop()
+            stats: PhaseStats = self.phases[key]
+            stats.seconds += seconds
+            stats.calls += 1
+            stats.peak_memory = max(stats.peak_memory, peak_memory)
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak_memory)
+            tracemalloc.reset_peak()
+            if subject is not None:
+                subject_seconds: dict[str, float] = self.subject_seconds.setdefault(name, {})
+                subject_seconds[subject] = subject_seconds.get(subject, 0.0) + seconds
+
+    def print_report(self, top_count: int) -> None:
+        print("\nProfile (wall time and peak traced memory include nested phases):")
+        print(f"{'phase':<60} {'seconds':>9} {'calls':>9} {'peak KiB':>10}")
+
+        def get_tree_position(key: tuple[str, ...]) -> list[int]:
+            return [self.phases[key[:depth]].index for depth in range(1, len(key) + 1)]
+        for key in sorted(self.phases, key=get_tree_position):
+            stats: PhaseStats = self.phases[key]
+            label: str = "  " * (len(key) - 1) + key[-1]
+            print(f"{label:<60} {stats.seconds:>9.3f} {stats.calls:>9} {stats.peak_memory / 1024:>10.0f}")
+        for name, subject_seconds in self.subject_seconds.items():
+            print(f"\nSlowest {top_count} in {name}:")
+            slowest: list[tuple[str, float]] = sorted(subject_seconds.items(), key=lambda entry: entry[1],
+                                                      reverse=True)[:top_count]
+            for subject, seconds in slowest:
+                print(f"    {seconds:>9.4f}s  {subject}")
+
+
+PROFILER = Profiler()
+NOT_PROFILING = contextlib.nullcontext()
+
+
+def profile_phase(name: str, subject: str | None = None) -> ContextManager:
+    if not PROFILER.enabled:
+        return NOT_PROFILING
+    return PROFILER.phase(name, subject)
+
+
+def profiled(function: Callable) -> Callable:
+    @functools.wraps(function)
+    def profiled_function(*args, **kwargs):
+        if not PROFILER.enabled:
+            return function(*args, **kwargs)
+        with PROFILER.phase(function.__qualname__):
+            return function(*args, **kwargs)
+    return profiled_function
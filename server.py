@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import http.server
+import json
+import threading
+import urllib.parse
+import zipfile
+from collections import OrderedDict
+from typing import NamedTuple
+
+from convert import *
+
+# The conversion options a request may set; options that read or write files on the server are left out
+SERVER_OPTION_NAMES: list[str] = ["author", "region_logic", "rule_cache_size", "max_dnf_clauses", "compile_rules",
+                                  "shared_rules", "dense_mappings", "compact"]
+# Errors a conversion raises for an APWorld that is not a valid Manual APWorld (including malformed requires rules,
+# which raise SyntaxError), answered with 400; anything else is a fault in the converter and answered with 500
+BAD_APWORLD_ERRORS: tuple[type[Exception], ...] = (zipfile.BadZipFile, FileNotFoundError, KeyError, ValueError,
+                                                   SyntaxError)
+
+
+class CachedPack(NamedTuple):
+    files: dict[str, bytes]
+    archive: bytes
+
+
+class PackCache:
+    def __init__(self, max_size: int = 16) -> None:
+        if max_size < 1:
+            raise ValueError(f"Pack cache size must be at least 1! Given size: {max_size}")
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[str, CachedPack] = OrderedDict()
+        self._entries_lock: threading.Lock = threading.Lock()
+        # one lock per pack being converted, so a world requested twice at once is only converted once while different
+        # worlds convert in parallel; guarded by the entries lock
+        self._conversion_locks: dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def get_key(apworld: bytes, options: dict[str, any]) -> str:
+        options_json: str = json.dumps(options, sort_keys=True)
+        return hashlib.sha256(apworld + b"\0" + options_json.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> CachedPack | None:
+        with self._entries_lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def _store(self, key: str, pack: CachedPack) -> None:
+        with self._entries_lock:
+            self._entries[key] = pack
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _count(self, cached: bool) -> None:
+        # requests are handled on several threads at once
+        with self._entries_lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def convert(self, apworld: bytes, options: dict[str, any]) -> tuple[str, CachedPack, bool]:
+        key: str = self.get_key(apworld, options)
+        pack: CachedPack | None = self.get(key)
+        if pack is None:
+            with self._entries_lock:
+                conversion_lock: threading.Lock = self._conversion_locks.setdefault(key, threading.Lock())
+            with conversion_lock:
+                pack = self.get(key)
+                if pack is None:
+                    try:
+                        files: dict[str, bytes] = convert_apworld_in_memory(apworld, **options)
+                        pack = CachedPack(files, build_pack_archive(files))
+                        self._store(key, pack)
+                    finally:
+                        # requests waiting on this lock find the pack in the cache; later ones need no lock
+                        with self._entries_lock:
+                            self._conversion_locks.pop(key, None)
+                    self._count(False)
+                    return key, pack, False
+        self._count(True)
+        return key, pack, True
+
+
+def parse_options(query: str) -> dict[str, any]:
+    default_args: dict[str, any] = vars(get_conversion_args())
+    options: dict[str, any] = {}
+    for option_name, values in urllib.parse.parse_qs(query, keep_blank_values=True).items():
+        if option_name not in SERVER_OPTION_NAMES:
+            raise ValueError(f"Unknown conversion option: {option_name}")
+        value: str = values[-1]
+        if isinstance(default_args[option_name], bool):
+            options[option_name] = value.lower() in ["", "1", "true", "yes"]
+        elif isinstance(default_args[option_name], int):
+            options[option_name] = int(value)
+        else:
+            options[option_name] = value
+    return options
+
+
+class ConversionRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: "ConversionServer"
+
+    def send_bytes(self, status: int, content_type: str, body: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_text(self, status: int, message: str) -> None:
+        self.send_bytes(status, "text/plain; charset=utf-8", f"{message}\n".encode("utf-8"))
+
+    def do_POST(self) -> None:
+        url: urllib.parse.SplitResult = urllib.parse.urlsplit(self.path)
+        if url.path != "/convert":
+            self.send_error_text(404, f"Unknown path: {url.path}")
+            return
+        try:
+            options: dict[str, any] = parse_options(url.query)
+        except ValueError as e:
+            self.send_error_text(400, str(e))
+            return
+        apworld: bytes = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            key, pack, cached = self.server.pack_cache.convert(apworld, options)
+        except BAD_APWORLD_ERRORS as e:
+            self.send_error_text(400, f"Could not convert the APWorld: {type(e).__name__}: {e}")
+            return
+        except Exception as e:
+            self.send_error_text(500, f"The converter failed: {type(e).__name__}: {e}")
+            return
+        self.send_bytes(200, "application/zip", pack.archive,
+                        {"X-Pack-Key": key, "X-Pack-Cache": "hit" if cached else "miss"})
+
+    def do_GET(self) -> None:
+        # /packs/<pack key>/<file path in the pack> serves single files of a pack converted earlier
+        url_path: str = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        path_parts: list[str] = url_path.lstrip("/").split("/", 2)
+        if len(path_parts) != 3 or path_parts[0] != "packs":
+            self.send_error_text(404, f"Unknown path: {url_path}")
+            return
+        pack: CachedPack | None = self.server.pack_cache.get(path_parts[1])
+        if pack is None:
+            self.send_error_text(404, f"No cached pack with key {path_parts[1]}; convert the APWorld again")
+            return
+        if path_parts[2] not in pack.files:
+            self.send_error_text(404, f"The pack has no file {path_parts[2]}")
+            return
+        content_type: str = "image/png" if path_parts[2].endswith(".png") else "text/plain; charset=utf-8"
+        self.send_bytes(200, content_type, pack.files[path_parts[2]])
+
+
+class ConversionServer(http.server.ThreadingHTTPServer):
+    def __init__(self, address: tuple[str, int], pack_cache: PackCache) -> None:
+        super().__init__(address, ConversionRequestHandler)
+        self.pack_cache: PackCache = pack_cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local server that converts Manual APWorlds to PopTracker "
+                                                 "packs, keeping recently converted packs in memory.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on. Defaults to 8000.")
+    parser.add_argument("--cache_size", type=int, default=16,
+                        help="The number of converted packs to keep in memory. Defaults to 16.")
+    args = parser.parse_args()
+    server: ConversionServer = ConversionServer((args.host, args.port), PackCache(args.cache_size))
+    print(f"Converting APWorlds at http://{args.host}:{server.server_address[1]}/convert")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,471 @@
+import argparse
+import json
+import operator
+import os
+import random
+import re
+import sys
+import time
+import zipfile
+from typing import Callable
+
+# The scripts the converter writes generated rule functions to, which the simulator translates to Python
+GENERATED_RULE_SCRIPTS = ["scripts/factored_rules.lua", "scripts/compiled_rules.lua"]
+LUA_FUNCTION_PATTERN = re.compile(r"^function (\w+)\(\)\n(.*?)^end$", re.MULTILINE | re.DOTALL)
+LUA_TOKEN_PATTERN = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|(\d+(?:\.\d+)?)|([A-Za-z_]\w*)|(~=|==|>=|<=|[()<>,:=]))')
+LUA_TABLE_ENTRY_PATTERN = re.compile(r'\["([^"]*)"\]\s*=\s*\{(.*)\}')
+LUA_STRING_PATTERN = re.compile(r'"([^"]*)"')
+LUA_NUMBER_ENTRY_PATTERN = re.compile(r'\["([^"]*)"\]\s*=\s*(-?\d+)')
+ADD_LOCATIONS_PATTERN = re.compile(r'Tracker:AddLocations\("([^"]+)"\)')
+LUA_KEYWORDS: dict[str, str] = {"and": "and", "or": "or", "not": "not", "true": "True", "false": "False", "nil": "None"}
+
+YAML_COMPARE_OPERATORS: dict[str, Callable[[int, float], bool]] = {
+    "EQ": operator.eq,
+    "NE": operator.ne,
+    "LT": operator.lt,
+    "LE": operator.le,
+    "GT": operator.gt,
+    "GE": operator.ge,
+}
+
+# Stands in for the item counts of codes that no item or option in the pack limits
+UNLIMITED_COUNT = sys.maxsize
+
+# A rule check: the bits of the items it needs in PackState.owned, and a closure for anything else (either may be empty)
+TermCheck = tuple[int, Callable[["PackState"], bool] | None]
+
+
+class PackState:
+    __slots__ = ("counts", "owned", "group_counts", "value_totals")
+
+    def __init__(self, counts: list[int], owned: int, group_counts: list[int], value_totals: list[int]) -> None:
+        self.counts: list[int] = counts
+        # bit i is set when the code with index i has a count above 0
+        self.owned: int = owned
+        self.group_counts: list[int] = group_counts
+        self.value_totals: list[int] = value_totals
+
+    def copy(self) -> "PackState":
+        return PackState(list(self.counts), self.owned, list(self.group_counts), list(self.value_totals))
+
+
+def read_pack_files(pack_path: str) -> dict[str, bytes]:
+    # images are never needed to evaluate rules, so they are not read
+    if zipfile.is_zipfile(pack_path):
+        with zipfile.ZipFile(pack_path) as archive:
+            return {file_location: archive.read(file_location) for file_location in archive.namelist()
+                    if not file_location.endswith("/") and not file_location.endswith(".png")}
+    files: dict[str, bytes] = {}
+    for directory, _, file_names in os.walk(pack_path):
+        for file_name in file_names:
+            if file_name.endswith(".png"):
+                continue
+            full_filepath: str = os.path.join(directory, file_name)
+            with open(full_filepath, 'rb') as file:
+                files[os.path.relpath(full_filepath, pack_path).replace(os.sep, "/")] = file.read()
+    return files
+
+
+def to_number(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def unescape_lua_string(token: str) -> str:
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) == "n" else match.group(1), token[1:-1])
+
+
+def tokenize_lua_expression(expression: str) -> list[tuple[str, str]]:
+    tokens: list[tuple[str, str]] = []
+    index: int = 0
+    expression = expression.rstrip()
+    while index < len(expression):
+        match: re.Match | None = LUA_TOKEN_PATTERN.match(expression, index)
+        if match is None:
+            raise SyntaxError(f"Unsupported Lua syntax at index {index} of {expression}")
+        kind: str = ["string", "number", "name", "symbol"][match.lastindex - 1]
+        tokens.append((kind, match.group(match.lastindex)))
+        index = match.end()
+    return tokens
+
+
+class PackSimulator:
+    def __init__(self,
+                 files: dict[str, bytes],
+                 custom_functions: dict[str, Callable[..., bool]] | None = None,
+                 custom_function_default: bool = True) -> None:
+        # custom functions are called with the state and the rule's parameters; ones without an implementation here
+        # are taken to return custom_function_default, like the stubs in custom_util.lua return true
+        self.custom_functions: dict[str, Callable[..., bool]] = custom_functions or {}
+        self.custom_function_default: bool = custom_function_default
+        self.code_indexes: dict[str, int] = {}
+        self.max_counts: list[int] = []
+        self.item_codes_by_name: dict[str, str] = {}
+        self.group_indexes: dict[str, int] = {}
+        self.value_indexes: dict[str, int] = {}
+        code_groups: dict[str, list[int]] = {}
+        code_values: dict[str, list[tuple[int, int]]] = {}
+
+        for items_location in ["items/items.json", "items/options.json"]:
+            for item in json.loads(files.get(items_location, b"[]")):
+                self.load_item(item)
+        if "scripts/item_data.lua" in files:
+            table_name: str = ""
+            for line in files["scripts/item_data.lua"].decode("utf_8").split("\n"):
+                line = line.strip()
+                if line.endswith("= {") and not line.startswith("["):
+                    table_name = line.split("=")[0].strip()
+                    continue
+                entry_match: re.Match | None = LUA_TABLE_ENTRY_PATTERN.match(line)
+                if entry_match is None:
+                    continue
+                if table_name == "ITEM_GROUPS":
+                    group_index: int = self.group_indexes.setdefault(entry_match.group(1), len(self.group_indexes))
+                    for code in LUA_STRING_PATTERN.findall(entry_match.group(2)):
+                        code_groups.setdefault(code, []).append(group_index)
+                elif table_name == "ITEM_VALUES":
+                    value_index: int = self.value_indexes.setdefault(entry_match.group(1), len(self.value_indexes))
+                    for code, item_value in LUA_NUMBER_ENTRY_PATTERN.findall(entry_match.group(2)):
+                        code_values.setdefault(code, []).append((value_index, int(item_value)))
+
+        self.lua_function_names: set[str] = set()
+        lua_functions: list[tuple[str, str]] = []
+        for script_location in GENERATED_RULE_SCRIPTS:
+            if script_location in files:
+                for function_match in LUA_FUNCTION_PATTERN.finditer(files[script_location].decode("utf_8")):
+                    self.lua_function_names.add(function_match.group(1))
+                    lua_functions.append((function_match.group(1), function_match.group(2)))
+        self.lua_namespace: dict[str, any] = {}
+        self.load_lua_functions(lua_functions)
+
+        # every location and section, parents before their children
+        self.node_ids: list[str] = []
+        self.node_parents: list[int] = []
+        self.node_rules: list[Callable[[PackState], bool] | None] = []
+        self.node_visibility: list[Callable[[PackState], bool] | None] = []
+        self.node_indexes: dict[str, int] = {}
+        self.section_indexes: list[int] = []
+        self.section_ids_by_name: dict[str, str] = {}
+        init_script: str = files.get("scripts/init.lua", b"").decode("utf_8")
+        for locations_location in ADD_LOCATIONS_PATTERN.findall(init_script):
+            for location in json.loads(files[locations_location]):
+                self.load_location(location, -1, False)
+
+        self.code_groups: list[list[int]] = [code_groups.get(code, []) for code in self.code_indexes]
+        self.code_values: list[list[tuple[int, int]]] = [code_values.get(code, []) for code in self.code_indexes]
+
+    def get_code_index(self, code: str) -> int:
+        if code not in self.code_indexes:
+            self.code_indexes[code] = len(self.code_indexes)
+            self.max_counts.append(UNLIMITED_COUNT)
+        return self.code_indexes[code]
+
+    def load_item(self, item: dict[str, any]) -> None:
+        if item["type"] == "progressive":
+            for stage in item.get("stages", []):
+                self.load_item(stage | {"type": "toggle"})
+            return
+        codes: list[str] = [code.strip() for code in item.get("codes", "").split(",") if code.strip()]
+        for code in codes:
+            self.max_counts[self.get_code_index(code)] = int(item.get("max_quantity", 1)) \
+                if item["type"] == "consumable" else 1
+        if codes and "name" in item:
+            self.item_codes_by_name.setdefault(item["name"], codes[0])
+
+    def load_lua_functions(self, lua_functions: list[tuple[str, str]]) -> None:
+        # each generated Lua function becomes a Python function of the state, with item lookups resolved to indexes
+        python_source: str = ""
+        for function_name, function_body in lua_functions:
+            python_source += f"def lua_{function_name}(state):\n    counts = state.counts\n    owned = state.owned\n"
+            for statement in function_body.split("\n"):
+                statement = statement.strip()
+                if not statement or statement.startswith("--"):
+                    continue
+                if statement.startswith("local "):
+                    local_name, _, expression = statement[len("local "):].partition("=")
+                    python_source += f"    lua_{local_name.strip()} = {self.translate_lua_expression(expression)}\n"
+                elif statement.startswith("return "):
+                    python_source += f"    return {self.translate_lua_expression(statement[len('return '):])}\n"
+                else:
+                    raise SyntaxError(f"Unsupported Lua statement in {function_name}: {statement}")
+        exec(compile(python_source, "<generated rule scripts>", "exec"), self.lua_namespace)
+
+    def translate_lua_expression(self, expression: str) -> str:
+        tokens: list[tuple[str, str]] = tokenize_lua_expression(expression)
+        python_expression: list[str] = []
+        index: int = 0
+        while index < len(tokens):
+            kind, text = tokens[index]
+            if kind == "name" and text == "Tracker" and [token[1] for token in tokens[index + 1:index + 4]] == \
+                    [":", "ProviderCountForCode", "("] and tokens[index + 4][0] == "string":
+                python_expression.append(f"counts[{self.get_code_index(unescape_lua_string(tokens[index + 4][1]))}]")
+                index += 6
+            elif kind == "name" and text not in LUA_KEYWORDS and tokens[index + 1:index + 2] == [("symbol", "(")]:
+                # every call the converter generates has literal arguments, so it is checked like a rule term
+                params: list[str] = []
+                index += 2
+                while tokens[index][1] != ")":
+                    if tokens[index][0] == "string":
+                        params.append(unescape_lua_string(tokens[index][1]))
+                    elif tokens[index][0] == "number":
+                        params.append(tokens[index][1])
+                    elif tokens[index][1] != ",":
+                        raise SyntaxError(f"Unsupported argument {tokens[index][1]} in call to {text}")
+                    index += 1
+                python_expression.append(self.get_check_expression(self.compile_function_call(text, params)))
+                index += 1
+            elif kind == "name":
+                python_expression.append(LUA_KEYWORDS.get(text, f"lua_{text}"))
+                index += 1
+            else:
+                python_expression.append("!=" if text == "~=" else text)
+                index += 1
+        return " ".join(python_expression)
+
+    def get_check_expression(self, term_check: TermCheck) -> str:
+        mask, check = term_check
+        parts: list[str] = []
+        if mask:
+            parts.append(f"(owned & {mask} == {mask})")
+        if check is not None:
+            check_name: str = f"check_{len(self.lua_namespace)}"
+            self.lua_namespace[check_name] = check
+            parts.append(f"{check_name}(state)")
+        return f"({' and '.join(parts)})" if parts else "True"
+
+    def compile_function_call(self, function_name: str, params: list[str]) -> TermCheck:
+        if function_name in ["has_count_from_group", "ItemValue"]:
+            indexes: dict[str, int] = self.group_indexes if function_name == "has_count_from_group" \
+                else self.value_indexes
+            required: float | None = to_number(params[1]) if len(params) > 1 else None
+            if params[0] not in indexes or required is None:
+                return 0, lambda state: False
+            total_index: int = indexes[params[0]]
+            if function_name == "has_count_from_group":
+                return 0, lambda state: state.group_counts[total_index] >= required
+            return 0, lambda state: state.value_totals[total_index] >= required
+        if function_name == "YamlEnabled":
+            return 1 << self.get_code_index(params[0]), None
+        if function_name in ["YamlDisabled", "negate"]:
+            code_index: int = self.get_code_index(params[0])
+            return 0, lambda state: state.counts[code_index] == 0
+        if function_name.startswith("YamlCompare_") and function_name[len("YamlCompare_"):] in YAML_COMPARE_OPERATORS:
+            compare: Callable[[int, float], bool] = YAML_COMPARE_OPERATORS[function_name[len("YamlCompare_"):]]
+            code_index: int = self.get_code_index(params[0])
+            value: float | None = to_number(params[1]) if len(params) > 1 else None
+            if value is None:
+                return 0, lambda state: False
+            return 0, lambda state: compare(state.counts[code_index], value)
+        if function_name in self.lua_function_names:
+            # looked up on each call, as the function may be defined after the rule using it
+            return 0, lambda state: bool(self.lua_namespace[f"lua_{function_name}"](state))
+        if function_name in self.custom_functions:
+            custom_function: Callable[..., bool] = self.custom_functions[function_name]
+            return 0, lambda state: bool(custom_function(state, *params))
+        return (0, None) if self.custom_function_default else (0, lambda state: False)
+
+    def compile_term(self, term: str) -> TermCheck:
+        term = term.strip()
+        # sequence breaks ([...]) are counted as accessible; there is only one level of accessibility here
+        if term.startswith("[") and term.endswith("]"):
+            term = term[1:-1].strip()
+        term = term.lstrip("^")
+        if term.startswith("@"):
+            node_id: str = term[1:]
+            return 0, lambda state: node_id in self.node_indexes and \
+                self.is_node_accessible(state, self.node_indexes[node_id])
+        if term.startswith("$"):
+            function_name, *params = term[1:].split("|")
+            return self.compile_function_call(function_name, params)
+        code, _, count = term.partition(":")
+        code_index: int = self.get_code_index(code)
+        required_count: int = int(count) if count else 1
+        if required_count <= 1:
+            return 1 << code_index, None
+        return 0, lambda state: state.counts[code_index] >= required_count
+
+    def compile_rules(self, rules: list[str]) -> Callable[[PackState], bool] | None:
+        # each rule is a comma-separated list of terms that must all hold; the list holds if any rule does
+        if not rules:
+            return None
+        clauses: list[tuple[int, tuple[Callable[[PackState], bool], ...]]] = []
+        for rule in rules:
+            clause_mask: int = 0
+            clause_checks: list[Callable[[PackState], bool]] = []
+            for term in rule.split(","):
+                if not term.strip():
+                    continue
+                mask, check = self.compile_term(term)
+                clause_mask |= mask
+                if check is not None:
+                    clause_checks.append(check)
+            if not clause_mask and not clause_checks:
+                return None
+            clauses.append((clause_mask, tuple(clause_checks)))
+        if len(clauses) == 1 and not clauses[0][1]:
+            only_mask: int = clauses[0][0]
+            return lambda state: state.owned & only_mask == only_mask
+
+        def evaluate(state: PackState) -> bool:
+            owned: int = state.owned
+            for clause_mask, clause_checks in clauses:
+                if owned & clause_mask == clause_mask:
+                    for clause_check in clause_checks:
+                        if not clause_check(state):
+                            break
+                    else:
+                        return True
+            return False
+        return evaluate
+
+    def load_location(self, location: dict[str, any], parent_index: int, is_section: bool) -> None:
+        parent_id: str = self.node_ids[parent_index] + "/" if parent_index >= 0 else ""
+        node_index: int = len(self.node_ids)
+        self.node_ids.append(parent_id + location["name"])
+        self.node_parents.append(parent_index)
+        self.node_rules.append(self.compile_rules(location.get("access_rules", [])))
+        self.node_visibility.append(self.compile_rules(location.get("visibility_rules", [])))
+        self.node_indexes.setdefault(self.node_ids[node_index], node_index)
+        if is_section:
+            self.section_indexes.append(node_index)
+            self.section_ids_by_name.setdefault(location["name"], self.node_ids[node_index])
+        for child in location.get("children", []):
+            self.load_location(child, node_index, False)
+        for section in location.get("sections", []):
+            self.load_location(section, node_index, True)
+
+    def create_state(self, counts: dict[str, int] | None = None) -> PackState:
+        state: PackState = PackState([0] * len(self.code_indexes), 0, [0] * len(self.group_indexes),
+                                     [0] * len(self.value_indexes))
+        for code, count in (counts or {}).items():
+            self.add_item(state, code, count)
+        return state
+
+    def add_item(self, state: PackState, code: str, amount: int = 1) -> None:
+        # codes no rule or item uses cannot change what is accessible, so they are ignored
+        code_index: int | None = self.code_indexes.get(self.item_codes_by_name.get(code, code))
+        if code_index is None:
+            return
+        old_count: int = state.counts[code_index]
+        new_count: int = max(0, min(old_count + amount, self.max_counts[code_index]))
+        if new_count == old_count:
+            return
+        state.counts[code_index] = new_count
+        if new_count:
+            state.owned |= 1 << code_index
+        else:
+            state.owned &= ~(1 << code_index)
+        for group_index in self.code_groups[code_index]:
+            state.group_counts[group_index] += new_count - old_count
+        for value_index, item_value in self.code_values[code_index]:
+            state.value_totals[value_index] += (new_count - old_count) * item_value
+
+    def is_node_accessible(self, state: PackState, node_index: int) -> bool:
+        while node_index >= 0:
+            rule: Callable[[PackState], bool] | None = self.node_rules[node_index]
+            if rule is not None and not rule(state):
+                return False
+            node_index = self.node_parents[node_index]
+        return True
+
+    def get_accessible_sections(self, state: PackState) -> list[int]:
+        # a location or section is accessible when it is visible, its own rules hold and so do its parent's
+        node_access: list[bool] = [False] * len(self.node_ids)
+        node_parents: list[int] = self.node_parents
+        node_rules: list[Callable[[PackState], bool] | None] = self.node_rules
+        node_visibility: list[Callable[[PackState], bool] | None] = self.node_visibility
+        for node_index in range(len(node_access)):
+            parent_index: int = node_parents[node_index]
+            if parent_index >= 0 and not node_access[parent_index]:
+                continue
+            visibility: Callable[[PackState], bool] | None = node_visibility[node_index]
+            if visibility is not None and not visibility(state):
+                continue
+            rule: Callable[[PackState], bool] | None = node_rules[node_index]
+            node_access[node_index] = rule is None or rule(state)
+        return [section_index for section_index in self.section_indexes if node_access[section_index]]
+
+    def get_reachable_locations(self, state: PackState) -> list[str]:
+        return [self.node_ids[section_index] for section_index in self.get_accessible_sections(state)]
+
+    def get_spheres(self, placements: dict[str, list[str]], state: PackState | None = None) -> list[list[str]]:
+        # placements map section ids to the items (names or codes) found there; the items found in one sphere can
+        # only be used from the next one on, like Archipelago's own spheres
+        state = state.copy() if state is not None else self.create_state()
+        checked: set[int] = set()
+        spheres: list[list[str]] = []
+        while True:
+            sphere: list[int] = [section_index for section_index in self.get_accessible_sections(state)
+                                 if section_index not in checked]
+            if not sphere:
+                return spheres
+            spheres.append([self.node_ids[section_index] for section_index in sphere])
+            checked.update(sphere)
+            for section_index in sphere:
+                for item in placements.get(self.node_ids[section_index], []):
+                    self.add_item(state, item)
+
+    def resolve_placements(self, placements: dict[str, str | list[str]]) -> dict[str, list[str]]:
+        # locations may be given by section id or by name
+        resolved: dict[str, list[str]] = {}
+        for location, items in placements.items():
+            section_id: str = location if location in self.node_indexes else \
+                self.section_ids_by_name.get(location.replace("/", "-"), location)
+            resolved.setdefault(section_id, []).extend([items] if isinstance(items, str) else items)
+        return resolved
+
+
+def measure_throughput(simulator: PackSimulator, state_count: int, seed: int) -> float:
+    rng: random.Random = random.Random(seed)
+    codes: list[str] = list(simulator.code_indexes)
+    states: list[PackState] = [simulator.create_state({code: rng.randint(0, 3) for code in codes if rng.random() < 0.5})
+                               for _ in range(state_count)]
+    start_time: float = time.perf_counter()
+    for state in states:
+        simulator.get_accessible_sections(state)
+    return state_count / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a generated PopTracker pack's rules in Python, to find the "
+                                                 "locations reachable with a set of items and the spheres of a seed.")
+    parser.add_argument("pack_path", help="The pack to load, as a folder or a .zip archive.")
+    parser.add_argument("--items", help="A JSON file of the items and options held, as an object from item name or "
+                                        "code to count.")
+    parser.add_argument("--placements", help="A JSON file of the items placed at each location, as an object from "
+                                             "location name or id to an item name or code (or a list of them). The "
+                                             "reachable locations are then shown sphere by sphere.")
+    parser.add_argument("--custom_functions", choices=["true", "false"], default="true",
+                        help="What custom logic functions are taken to return, as they cannot be run outside "
+                             "PopTracker. Defaults to true, like the generated stubs.")
+    parser.add_argument("--list", action="store_true", help="List the reachable locations, not just their number.")
+    parser.add_argument("--benchmark", type=int, metavar="STATE_COUNT",
+                        help="Also measure how many random item states per second can be evaluated.")
+    args = parser.parse_args()
+
+    simulator: PackSimulator = PackSimulator(read_pack_files(args.pack_path),
+                                             custom_function_default=args.custom_functions == "true")
+    start_state: PackState = simulator.create_state()
+    if args.items:
+        with open(args.items, encoding="utf_8") as items_file:
+            start_state = simulator.create_state(json.load(items_file))
+    reachable_locations: list[str] = simulator.get_reachable_locations(start_state)
+    print(f"{len(reachable_locations)} of {len(simulator.section_indexes)} locations reachable")
+    if args.list:
+        for location_id in reachable_locations:
+            print(f"    {location_id}")
+    if args.placements:
+        with open(args.placements, encoding="utf_8") as placements_file:
+            spheres: list[list[str]] = simulator.get_spheres(simulator.resolve_placements(json.load(placements_file)),
+                                                             start_state)
+        for sphere_index, sphere in enumerate(spheres):
+            print(f"Sphere {sphere_index}: {len(sphere)} locations")
+            if args.list:
+                for location_id in sphere:
+                    print(f"    {location_id}")
+        unreachable_count: int = len(simulator.section_indexes) - sum(len(sphere) for sphere in spheres)
+        print(f"{unreachable_count} locations never become reachable")
+    if args.benchmark:
+        print(f"{measure_throughput(simulator, args.benchmark, 1):.0f} states per second")